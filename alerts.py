@@ -0,0 +1,445 @@
+"""
+Ежедневные оповещения без Streamlit: сигналы L/S по спредам и пробои полос SMA ± std / пересечения EWMA.
+
+    python alerts.py --store                      # новые даты локального архива
+    python alerts.py --workbook daily.xlsx        # новые даты дневного файла
+    python alerts.py --store --verify             # сверка состояния с расчетом по всей истории
+
+Состояние (последние значения для окон SMA/std, EWMA, предыдущие значения спредов и сработавшие
+в месяце сигналы) хранится в небольшом JSON-файле, поэтому каждая новая дата архива
+обрабатывается за O(окно), без пересчета истории. Первый запуск без состояния проходит
+историю архива молча и только запоминает состояние.
+"""
+import argparse
+import json
+import math
+import os
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+import data_cache
+from archive_store import STORE_DIR, ArchiveStore, validate_rows
+from indicators import ewma, rolling_mean_std
+from signals import crossing_matrix
+from spreads import FRONT_MONTH, FRONT_MONTH_SOURCE, compute_spreads, parse_spreads
+
+# По умолчанию файлы лежат в каталоге архива; имена с '_', чтобы их не подхватило чтение Parquet-датасета
+STATE_FILE = os.environ.get('BDI_ALERTS_STATE')
+SINK_FILE = os.environ.get('BDI_ALERTS_SINK')
+STATE_NAME = '_alerts_state.json'
+SINK_NAME = '_alerts.jsonl'
+ALERT_COLUMNS = ['ArchiveDate', 'Source', 'Indicator', 'Type', 'Level', 'Value']
+_STATE_VERSION = 1
+
+
+@dataclass
+class AlertConfig:
+    """Что отслеживать; при смене настроек состояние строится заново."""
+    categories: list = field(default_factory=lambda: ['C5TC FACT'])
+    sma_windows: list = field(default_factory=lambda: [20])
+    # Полосы SMA ± std только для окон из sma_windows
+    std_windows: list = field(default_factory=lambda: [20])
+    ewma_spans: list = field(default_factory=lambda: [30])
+    spreads: list = field(default_factory=lambda: ['C5TC / P5TC; L: 0.75, 0.5; S: 1.75, 2.0'])
+
+    def spread_specs(self):
+        return parse_spreads('\n'.join(self.spreads))
+
+    def as_dict(self):
+        return {'categories': list(self.categories), 'sma_windows': [int(x) for x in self.sma_windows],
+                'std_windows': [int(x) for x in self.std_windows], 'ewma_spans': [int(x) for x in self.ewma_spans],
+                'spreads': list(self.spreads)}
+
+    @property
+    def band_windows(self):
+        return [window for window in self.sma_windows if window in self.std_windows]
+
+    @property
+    def tracked_categories(self):
+        spread_categories = [category for spec in self.spread_specs() for category in (spec.left, spec.right)]
+        categories = list(dict.fromkeys(list(self.categories) + spread_categories))
+        # Ближайший месячный контракт берется из строк месячных контрактов
+        return [FRONT_MONTH_SOURCE if category == FRONT_MONTH else category for category in categories]
+
+
+def _alert(date, source, indicator, kind, level, value):
+    return {'ArchiveDate': pd.Timestamp(date), 'Source': source, 'Indicator': indicator, 'Type': kind,
+            'Level': float(level), 'Value': float(value)}
+
+
+def _crossings(price, prev_price, levels, prev_levels):
+    """Пробой вверх и вниз линии levels (сравнения с NaN дают False, как в crossing_matrix)."""
+    return (price > levels) & (prev_price <= prev_levels), (price < levels) & (prev_price >= prev_levels)
+
+
+class CategoryState:
+    """
+    Состояние индикаторов одной категории: последние max(окно) цен (кольцевой буфер),
+    взвешенное значение и вес EWMA, последняя цена и уровни полос для проверки пробоя.
+    """
+
+    def __init__(self, config, prices=(), ewma_state=None, last_price=math.nan, last_levels=None):
+        self.sma_windows = [int(window) for window in config.sma_windows]
+        self.band_windows = [int(window) for window in config.band_windows]
+        self.ewma_spans = [int(span) for span in config.ewma_spans]
+        self.size = max(self.sma_windows, default=0)
+        self.prices = [math.nan if price is None else float(price) for price in prices][-self.size:] \
+            if self.size else []
+        # span -> [взвешенное значение, вес]; None - ряд еще не начался
+        self.ewma_state = {int(span): value for span, value in (ewma_state or {}).items()}
+        self.last_price = last_price
+        self.last_levels = last_levels or {}
+
+    def _rolling(self):
+        window_values = {}
+        for window in self.sma_windows:
+            values = np.asarray(self.prices[-window:], dtype=float)
+            valid = values[~np.isnan(values)]
+            # Как rolling_mean_std: SMA с min_periods=1, std с ddof=1 и min_periods=window
+            sma = valid.mean() if len(valid) else math.nan
+            std = valid.std(ddof=1) if len(valid) >= window and len(valid) > 1 else math.nan
+            window_values[window] = (sma, std)
+        return window_values
+
+    def _update_ewma(self, price):
+        values = {}
+        for span in self.ewma_spans:
+            alpha = 2.0 / (span + 1.0)
+            state = self.ewma_state.get(span)
+            # Та же рекурсия, что _ewma_with_gaps (adjust=False, ignore_na=False)
+            if state is None:
+                weighted, weight = price, 1.0
+            else:
+                weighted, weight = state
+                started = weighted == weighted
+                if started:
+                    weight = weight * (1.0 - alpha)
+                if price == price:
+                    weighted = (weight * weighted + alpha * price) / (weight + alpha) if started else price
+                    weight = 1.0
+            self.ewma_state[span] = [weighted, weight]
+            values[span] = weighted
+        return values
+
+    def update(self, category, date, price):
+        """Добавляет цену новой даты, возвращает оповещения этой даты."""
+        if self.size:
+            self.prices.append(price)
+            del self.prices[:-self.size]
+        levels = {}
+        for window, (sma, std) in self._rolling().items():
+            if window in self.band_windows:
+                levels[f'SMA{window}+std'] = sma + std
+                levels[f'SMA{window}-std'] = sma - std
+        for span, value in self._update_ewma(price).items():
+            levels[f'EWMA{span}'] = value
+
+        alerts = []
+        for name, level in levels.items():
+            previous = self.last_levels.get(name, math.nan)
+            up, down = _crossings(price, self.last_price, level, previous)
+            if name.startswith('EWMA'):
+                kinds = (up, 'cross_up'), (down, 'cross_down')
+            else:
+                # Выход за полосу: вверх за верхнюю границу, вниз за нижнюю
+                kinds = ((up, 'band_upper'),) if name.endswith('+std') else ((down, 'band_lower'),)
+            for hit, kind in kinds:
+                if hit:
+                    alerts.append(_alert(date, category, name, kind, level, price))
+        self.last_price, self.last_levels = price, levels
+        return alerts
+
+    def to_dict(self):
+        return {'prices': self.prices, 'ewma': {str(span): value for span, value in self.ewma_state.items()},
+                'last_price': self.last_price, 'last_levels': self.last_levels}
+
+    @classmethod
+    def from_dict(cls, config, data):
+        return cls(config, data['prices'], data['ewma'], data['last_price'], data['last_levels'])
+
+
+class SpreadState:
+    """Предыдущее значение спреда и типы сигналов, уже сработавшие в текущем месяце."""
+
+    def __init__(self, spec, last_value=math.nan, month=None, fired=()):
+        self.spec = spec
+        self.last_value = last_value
+        self.month = month
+        self.fired = set(fired)
+
+    def update(self, date, value):
+        """Сигналы новой даты по правилам detect_signals: первый сигнал типа в месяце, L раньше S."""
+        month = pd.Timestamp(date).strftime('%Y-%m')
+        if month != self.month:
+            self.month, self.fired = month, set()
+        low_hits, high_hits = crossing_matrix([value], [self.last_value], self.spec.low_thresholds,
+                                              self.spec.high_thresholds)
+        alerts = []
+        for kind, hits, thresholds in (('L', low_hits[0], self.spec.low_thresholds),
+                                       ('S', high_hits[0], self.spec.high_thresholds)):
+            if kind not in self.fired and hits.any():
+                self.fired.add(kind)
+                alerts.append(_alert(date, self.spec.name, 'threshold', kind, thresholds[int(np.argmax(hits))], value))
+        self.last_value = value
+        return alerts
+
+    def to_dict(self):
+        return {'last_value': self.last_value, 'month': self.month, 'fired': sorted(self.fired)}
+
+
+class AlertState:
+    def __init__(self, config, last_date=None, categories=None, spreads=None):
+        self.config = config
+        self.last_date = last_date
+        self.categories = categories or {category: CategoryState(config) for category in config.categories}
+        self.specs = config.spread_specs()
+        self.spreads = spreads or {spec.name: SpreadState(spec) for spec in self.specs}
+
+    def process(self, rows):
+        """
+        Обрабатывает строки дат архива позже last_date по возрастанию дат.
+        rows - колонки Category, ArchiveDate, RouteAverage; возвращает оповещения.
+        """
+        tracked = self.config.tracked_categories
+        rows = rows[rows['Category'].isin(tracked)]
+        if self.last_date is not None:
+            rows = rows[rows['ArchiveDate'] > self.last_date]
+        rows = rows.sort_values('ArchiveDate', kind='stable')
+        alerts = []
+        for date, day in rows.groupby('ArchiveDate', sort=True):
+            prices = dict(zip(day['Category'].astype(str), day['RouteAverage'].to_numpy(dtype=float)))
+            front = day[(day['Category'] == FRONT_MONTH_SOURCE) & day['StartDate'].notna()]
+            if len(front):
+                # Первая строка с наименьшим StartDate, как в spreads._front_month
+                prices[FRONT_MONTH] = float(front['RouteAverage'].iloc[int(np.argmin(
+                    front['StartDate'].to_numpy(dtype='datetime64[ns]')))])
+            for category, state in self.categories.items():
+                if category in prices:
+                    alerts.extend(state.update(category, date, prices[category]))
+            for spec in self.specs:
+                # Спред - только на датах, где есть строки обеих категорий (как в compute_spread)
+                if spec.left in prices and spec.right in prices:
+                    left, right = prices[spec.left], prices[spec.right]
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        value = np.float64(left) / right if spec.op == 'ratio' else np.float64(left) - right
+                    alerts.extend(self.spreads[spec.name].update(date, float(value)))
+            self.last_date = pd.Timestamp(date)
+        return alerts
+
+    def to_json(self):
+        return {
+            'version': _STATE_VERSION,
+            'config': self.config.as_dict(),
+            'last_date': None if self.last_date is None else self.last_date.isoformat(),
+            'categories': {category: state.to_dict() for category, state in self.categories.items()},
+            'spreads': {name: state.to_dict() for name, state in self.spreads.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        config = AlertConfig(**data['config'])
+        specs = {spec.name: spec for spec in config.spread_specs()}
+        return cls(config, pd.Timestamp(data['last_date']) if data['last_date'] else None,
+                   {category: CategoryState.from_dict(config, state) for category, state in data['categories'].items()},
+                   {name: SpreadState(specs[name], state['last_value'], state['month'], state['fired'])
+                    for name, state in data['spreads'].items()})
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_json(), file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, config):
+        """Состояние из файла или None, если файла нет или он записан с другими настройками."""
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+        if data.get('version') != _STATE_VERSION or data['config'] != config.as_dict():
+            return None
+        return cls.from_json(data)
+
+
+def full_history_alerts(dataset, config, start_date=None):
+    """
+    Те же оповещения, посчитанные по всей истории векторно (rolling_mean_std, ewma, compute_spreads).
+    Для сверки инкрементального состояния; оповещения возвращаются с дат после start_date.
+    """
+    alerts = []
+    for category in config.categories:
+        data = dataset.category(category)
+        dates = data['ArchiveDate'].to_numpy()
+        prices = data['RouteAverage'].to_numpy(dtype=float)
+        prev_prices = np.concatenate(([np.nan], prices[:-1]))
+        levels = {}
+        if config.sma_windows:
+            means, stds = rolling_mean_std(prices, config.sma_windows)
+            for window, mean, std in zip(config.sma_windows, means, stds):
+                if window in config.band_windows:
+                    levels[f'SMA{window}+std'] = ('band_upper', mean + std)
+                    levels[f'SMA{window}-std'] = ('band_lower', mean - std)
+        if config.ewma_spans:
+            for span, values in zip(config.ewma_spans, ewma(prices, config.ewma_spans)):
+                levels[f'EWMA{span}'] = ('cross', values)
+        for name, (kind, values) in levels.items():
+            up, down = _crossings(prices, prev_prices, values, np.concatenate(([np.nan], values[:-1])))
+            kinds = [(up, 'cross_up'), (down, 'cross_down')] if kind == 'cross' else \
+                [(up if kind == 'band_upper' else down, kind)]
+            for hits, hit_kind in kinds:
+                for row in np.flatnonzero(hits):
+                    alerts.append(_alert(dates[row], category, name, hit_kind, values[row], prices[row]))
+
+    for spread in compute_spreads(dataset, config.spread_specs()):
+        for signal in spread.signals.itertuples(index=False):
+            alerts.append(_alert(signal.ArchiveDate, spread.spec.name, 'threshold', signal.Type, signal.Threshold,
+                                 signal.Ratio))
+    frame = pd.DataFrame(alerts, columns=ALERT_COLUMNS)
+    if start_date is not None:
+        frame = frame[frame['ArchiveDate'] > start_date]
+    return _sorted(frame)
+
+
+def _close(a, b, rtol):
+    a, b = float(a), float(b)
+    return (math.isnan(a) and math.isnan(b)) or math.isclose(a, b, rel_tol=rtol, abs_tol=rtol)
+
+
+def _all_close(a, b, rtol):
+    return len(a) == len(b) and all(_close(x, y, rtol) for x, y in zip(a, b))
+
+
+def state_differences(state, expected, rtol=1e-9):
+    """
+    Расхождения состояния с состоянием, построенным заново по всей истории.
+    Уровни сравниваются с допуском: инкрементальные суммы и EWMA расходятся с пересчетом на ~1e-12.
+    """
+    differences = []
+    if state.last_date != expected.last_date:
+        differences.append(f"last_date: {state.last_date} вместо {expected.last_date}")
+    for category, want in expected.categories.items():
+        got = state.categories.get(category)
+        if got is None:
+            differences.append(f"{category}: нет состояния")
+            continue
+        if not _all_close(got.prices, want.prices, rtol):
+            differences.append(f"{category}: буфер цен")
+        if sorted(got.ewma_state) != sorted(want.ewma_state) or not all(
+                _all_close(got.ewma_state[span], want.ewma_state[span], rtol) for span in want.ewma_state):
+            differences.append(f"{category}: EWMA")
+        if not _close(got.last_price, want.last_price, rtol) or sorted(got.last_levels) != sorted(
+                want.last_levels) or not all(_close(got.last_levels[name], level, rtol)
+                                             for name, level in want.last_levels.items()):
+            differences.append(f"{category}: последняя цена и уровни")
+    for name, want in expected.spreads.items():
+        got = state.spreads.get(name)
+        if got is None or not _close(got.last_value, want.last_value, rtol) or (got.month, got.fired) != (
+                want.month, want.fired):
+            differences.append(f"{name}: состояние спреда")
+    return differences
+
+
+def verify(state, alerts, dataset, persisted_date, rtol=1e-9):
+    """
+    Сверка сохраненного состояния с полным пересчетом по dataset.
+    state - состояние, загруженное из файла и продленное на новые даты (оповещения alerts);
+    сравниваются оповещения после persisted_date (дата состояния в файле) и само состояние
+    с состоянием, построенным заново по всей истории. Возвращает список расхождений.
+    """
+    expected_state = AlertState(state.config)
+    expected_state.process(dataset.df)
+    differences = state_differences(state, expected_state, rtol)
+    if persisted_date is not None:
+        keys = ['ArchiveDate', 'Source', 'Indicator', 'Type']
+        expected = full_history_alerts(dataset, state.config, persisted_date)
+        got = _sorted(pd.DataFrame(alerts, columns=ALERT_COLUMNS))
+        if len(got) != len(expected) or len(got) and not (
+                got[keys].equals(expected[keys]) and _all_close(got['Level'], expected['Level'], rtol)
+                and _all_close(got['Value'], expected['Value'], rtol)):
+            differences.append(f"оповещения после {persisted_date:%Y-%m-%d}: {len(got)} инкрементальных, "
+                               f"{len(expected)} по всей истории")
+    return differences
+
+
+def _sorted(frame):
+    return frame.sort_values(['ArchiveDate', 'Source', 'Indicator', 'Type'], kind='stable').reset_index(drop=True)
+
+
+def write_alerts(alerts, sink):
+    """Оповещения в JSON Lines (дописываются в конец файла) и построчно в stdout."""
+    if sink:
+        os.makedirs(os.path.dirname(os.path.abspath(sink)), exist_ok=True)
+        with open(sink, 'a', encoding='utf-8') as file:
+            for alert in alerts:
+                file.write(json.dumps(alert, ensure_ascii=False, default=str) + '\n')
+    for alert in alerts:
+        print(f"{alert['ArchiveDate']:%Y-%m-%d} {alert['Source']} {alert['Indicator']} {alert['Type']}: "
+              f"{alert['Value']:.4f} (уровень {alert['Level']:.4f})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ежедневные оповещения по сигналам и индикаторам FFA")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--store', nargs='?', const=STORE_DIR, help="Каталог локального архива")
+    source.add_argument('--workbook', help="xlsx с новыми датами (дневной файл)")
+    parser.add_argument('--state', default=STATE_FILE, help=f"Файл состояния (по умолчанию {STATE_NAME} в архиве)")
+    parser.add_argument('--sink', default=SINK_FILE,
+                        help=f"Файл оповещений JSON Lines (по умолчанию {SINK_NAME} в архиве), '' - только stdout")
+    parser.add_argument('--categories', nargs='+', help="Категории для SMA/EWMA")
+    parser.add_argument('--sma', type=int, nargs='+', help="Окна SMA")
+    parser.add_argument('--std', type=int, nargs='+', help="Окна SMA с полосой ± std")
+    parser.add_argument('--ewma', type=int, nargs='+', help="Периоды EWMA")
+    parser.add_argument('--spread', action='append', help="Спред как в приложении, можно повторять")
+    parser.add_argument('--verify', action='store_true',
+                        help="Сверить сохраненное состояние и новые оповещения с расчетом по всей истории архива")
+    args = parser.parse_args(argv)
+    store_dir = args.store or STORE_DIR
+    state_path = args.state or os.path.join(store_dir, STATE_NAME)
+    sink = os.path.join(store_dir, SINK_NAME) if args.sink is None else args.sink
+
+    config = AlertConfig()
+    for name, value in (('categories', args.categories), ('sma_windows', args.sma), ('std_windows', args.std),
+                        ('ewma_spans', args.ewma), ('spreads', args.spread)):
+        if value is not None:
+            setattr(config, name, value)
+
+    state = AlertState.load(state_path, config)
+    if args.workbook:
+        if state is None:
+            raise SystemExit("Нет состояния для этих настроек: сначала запустите с --store по полной истории")
+        with open(args.workbook, 'rb') as file:
+            rows = validate_rows(data_cache.read_workbook(file))
+        alerts = state.process(rows)
+    else:
+        archive = ArchiveStore(args.store)
+        if archive.is_empty:
+            raise SystemExit(f"Архив {args.store} пуст")
+        persisted_date = None if state is None else state.last_date
+        if state is None:
+            # Первый запуск: история проходится без оповещений, запоминается только состояние
+            state = AlertState(config)
+            state.process(archive.load(categories=config.tracked_categories))
+            alerts = []
+            print(f"Состояние построено по истории до {state.last_date:%Y-%m-%d}")
+        else:
+            alerts = state.process(archive.load(since=state.last_date, categories=config.tracked_categories))
+        if args.verify:
+            differences = verify(state, alerts, archive.dataset(), persisted_date)
+            print(f"Сверка с полным расчетом: {'совпадает' if not differences else 'РАСХОЖДЕНИЕ'}")
+            for difference in differences:
+                print(f"  {difference}")
+            if differences:
+                # Сломанное состояние не сохраняется: удалите файл, и следующий запуск построит его заново
+                raise SystemExit(f"Состояние {state_path} не совпадает с историей архива")
+
+    write_alerts(alerts, sink)
+    state.save(state_path)
+    print(f"Новых оповещений: {len(alerts)}, обработано до {state.last_date:%Y-%m-%d}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,208 +1,569 @@
-import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from datetime import timedelta
-from bdi_plot_maker import FFAForecastPlotter
-
-
-@st.cache_data
-def load_and_process_data(uploaded_file):
-    df = pd.read_excel(uploaded_file, parse_dates=['ArchiveDate', 'StartDate'])
-    df['ArchiveDate'] = pd.to_datetime(df['ArchiveDate'], format='%Y-%m-%d', errors='coerce')
-    return df
-
-
-st.markdown("""
-    <style>
-        .block-container {
-            max-width: 1300px;
-        }
-        .custom-column {
-            width: 80%;
-        }
-    </style>
-""", unsafe_allow_html=True)
-
-
-def empty_date_checker(df, selected_date):
-    selected_date = pd.to_datetime(selected_date)
-    return not df[(df['GroupDesc'] == 'BFA Cape') & (df['ArchiveDate'] == selected_date)].empty
-
-
-# --- Функция для обработки введенных порогов ---
-def parse_thresholds(text_input, default_values):
-    """Преобразует строку с порогами в список чисел."""
-    if not text_input.strip():
-        return []  # Возвращаем значения по умолчанию, если поле пустое
-    try:
-        # Разделяем по запятой, убираем пробелы и преобразуем в float
-        return [float(x.strip()) for x in text_input.split(',')]
-    except ValueError:
-        st.error(
-            f"Ошибка в формате порогов: '{text_input}'. Используйте числа, разделенные запятой (например: 0.75, 0.5).")
-        return None  # Возвращаем None в случае ошибки
-
-
-# Загрузка файла
-uploaded_file = st.file_uploader("Загрузите Excel-файл", type=["xlsx"])
-
-col1, col2, col3 = st.columns([1.7, 1.2, 0.8])  # Немного изменил пропорции для новых полей
-
-if uploaded_file:
-    with col1:
-        df = load_and_process_data(uploaded_file)
-        df['ArchiveDate'] = pd.to_datetime(df['ArchiveDate'], format='%Y-%m-%d', errors='coerce')
-
-        min_date = df.loc[df['GroupDesc'] == 'BFA Cape', 'ArchiveDate'].min()
-        max_date = df.loc[df['GroupDesc'] == 'BFA Cape', 'ArchiveDate'].max()
-
-        mode = st.radio("**Выберите режим**", ["Одна дата", "Несколько дат", "Месяц целиком"])
-
-        if mode == "Одна дата":
-            selected_date = st.date_input("**Выберите дату**", min_value=min_date, max_value=max_date)
-            selected_date = pd.to_datetime(selected_date)
-            if not empty_date_checker(df, selected_date):
-                st.write("⚠️ Данных за эту дату нет. Ищем ближайшую...")
-                data_found = False
-                for _ in range(15):
-                    selected_date -= timedelta(days=1)
-                    if empty_date_checker(df, selected_date):
-                        st.write(f"✅ Выбрана ближайшая дата: {selected_date.strftime('%Y-%m-%d')}.")
-                        data_found = True
-                        break
-                if not data_found:
-                    st.write("⛔ Данные не найдены за последние 15 дней.")
-            selected_dates = [selected_date]
-
-        elif mode == "Несколько дат":
-            available_months = sorted(df['ArchiveDate'].dt.strftime('%Y-%m').unique(), reverse=True)
-            selected_months = st.multiselect("Выберите месяц", available_months)
-            available_dates = \
-            df[(df['GroupDesc'] == 'BFA Cape') & (df['ArchiveDate'].dt.strftime('%Y-%m').isin(selected_months))][
-                'ArchiveDate'].unique()
-            selected_dates = st.multiselect("Выберите даты", sorted(available_dates),
-                                            format_func=lambda x: x.strftime('%Y-%m-%d'))
-            if not selected_dates:
-                st.warning("⚠️ Выберите хотя бы одну дату.")
-                st.stop()
-
-        elif mode == "Месяц целиком":
-            bfa_df = df[df['GroupDesc'] == 'BFA Cape']
-            available_months = sorted(bfa_df['ArchiveDate'].dt.strftime('%Y-%m').unique(), reverse=True)
-            default_month = available_months[1] if len(available_months) > 1 else (
-                available_months[0] if available_months else None)
-            selected_months = st.multiselect("Выберите месяц", available_months,
-                                             default=[default_month] if default_month else [])
-            if selected_months:
-                month_dates = \
-                df[(df['GroupDesc'] == 'BFA Cape') & (df['ArchiveDate'].dt.strftime('%Y-%m').isin(selected_months))][
-                    'ArchiveDate'].unique()
-                selected_dates = sorted(list(month_dates))
-            else:
-                selected_dates = []
-
-        forecast_types = st.multiselect("**Выберите тип прогноза**",
-                                        ['Monthly Contract (MON)', 'Quarterly Contract (Q)',
-                                         'Calendar Year Contract (CAL)'],
-                                        default=['Monthly Contract (MON)'])
-        if not forecast_types:
-            st.warning("⚠️ Пожалуйста, выберите хотя бы один тип прогноза.")
-            st.stop()
-
-    with col2:
-        st.markdown("**Настройки индикаторов**")
-        sma_90 = st.checkbox("90-дневная SMA", value=False)
-        rolling_std_90 = st.checkbox("Std Dev (90 дней)", value=sma_90, disabled=not sma_90)
-        sma_200 = st.checkbox("200-дневная SMA", value=False)
-        rolling_std_200 = st.checkbox("Std Dev (200 дней)", value=sma_200, disabled=not sma_200)
-        ewma_90 = st.checkbox("90-дневная EWMA", value=False)
-        ewma_30 = st.checkbox("30-дневная EWMA", value=False)
-
-        # --- НОВЫЙ БЛОК ДЛЯ ПОРОГОВ ---
-        st.markdown("**Настройки сигналов для Ratio**")
-        low_thresholds_input = st.text_input(
-            "Нижние пороги (сигнал 'L')",
-            "0.75, 0.5",
-            help="Введите значения через запятую"
-        )
-        high_thresholds_input = st.text_input(
-            "Верхние пороги (сигнал 'S')",
-            "1.75, 2.0",
-            help="Введите значения через запятую"
-        )
-        # -------------------------------
-
-    with col3:
-        st.markdown("**Доп. настройки**")
-        average_forcast_mode = st.checkbox("Усреднить прогнозы", value=False)
-        average_forcast_mode_group = st.selectbox(
-            "Группировать по:",
-            options=[False, "Месяцам", "Месяца до кварталов"],
-            index=0,
-            disabled=not average_forcast_mode
-        )
-
-    start_date, end_date = st.slider(
-        "**Выберите диапазон дат**",
-        min_value=min_date.date(),
-        max_value=max_date.date(),
-        value=(min_date.date(), max_date.date())
-    )
-
-    historical_data_types = st.multiselect("**Исторические данные**",
-                                           ['C5TC FACT', 'P5TC FACT', 'Brent Oil', 'C5TC / P5TC'],
-                                           default=['C5TC FACT', 'P5TC FACT',
-                                                    'C5TC / P5TC'])  # Добавил P5TC по умолчанию
-
-    if "Brent Oil" in historical_data_types and "C5TC / P5TC" in historical_data_types:
-        st.warning("Нельзя выбрать 'Brent Oil' и 'C5TC / P5TC' одновременно. Оставьте только один вариант.")
-        st.stop()
-
-    if "C5TC / P5TC" in historical_data_types and (
-            'C5TC FACT' not in historical_data_types or 'P5TC FACT' not in historical_data_types):
-        st.warning("Для расчета 'C5TC / P5TC' необходимо выбрать 'C5TC FACT' и 'P5TC FACT'.")
-        st.stop()
-
-if uploaded_file:
-    low_thresholds = parse_thresholds(low_thresholds_input, [0.75, 0.5])
-    high_thresholds = parse_thresholds(high_thresholds_input, [1.75, 2.0])
-
-    if low_thresholds is not None and high_thresholds is not None and selected_dates:
-        plotter = FFAForecastPlotter(df, sma_90=sma_90,
-                                     sma_200=sma_200,
-                                     ewma_30=ewma_30,
-                                     ewma_90=ewma_90,
-                                     rolling_std_90=rolling_std_90,
-                                     rolling_std_200=rolling_std_200)
-
-        # --- ИЗМЕНЕНИЕ 1: Присваиваем результат вызова переменной ---
-        final_signals = plotter.plot_forecast(historical_data_types, forecast_types, selected_dates, start_date,
-                                              end_date,
-                                              average_forcast_mode, average_forcast_mode_group,
-                                              low_thresholds=low_thresholds,
-                                              high_thresholds=high_thresholds)
-
-        # --- ИЗМЕНЕНИЕ 2: Выводим таблицу с сигналами под графиком ---
-        st.markdown("---")  # Горизонтальная линия для разделения
-        st.subheader("Сработавшие сигналы")
-
-        if not final_signals.empty:
-            # Выбираем и переименовываем нужные колонки для красивого вывода
-            display_df = final_signals[['ArchiveDate', 'Type', 'Threshold', 'Ratio']].copy()
-            display_df.rename(columns={
-                'ArchiveDate': 'Дата сигнала',
-                'Type': 'Тип (L/S)',
-                'Threshold': 'Пробитый порог',
-                'Ratio': 'Значение Ratio'
-            }, inplace=True)
-
-            # Форматируем дату и число для лучшей читаемости
-            display_df['Дата сигнала'] = display_df['Дата сигнала'].dt.strftime('%d-%m-%Y')
-            display_df['Значение Ratio'] = display_df['Значение Ratio'].map('{:,.2f}'.format)
-
-            st.dataframe(display_df, use_container_width=True)
-
-
-        else:
-            st.info("В выбранном диапазоне сигналов по заданным порогам не найдено.")
+import streamlit as st
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+import io
+import uuid
+from concurrent.futures import CancelledError
+from datetime import timedelta
+from archive_store import ArchiveStore
+from bdi_plot_maker import FFAForecastPlotter
+from compute_pool import ComputePool
+from data_cache import content_hash, load_workbook, read_workbook
+from dataset_registry import DatasetRegistry
+from ffa_analytics import compute_forecast
+from ffa_dataset import FFADataset
+from figure_cache import FigureCache
+from forecast_accuracy import AccuracyStore
+from indicators import IndicatorStore
+from profiling import StageProfiler
+from spreads import FRONT_MONTH, parse_spreads
+from signals import compute_ratio, extend_ratio_signals, ratio_signals
+from sql_store import SQLDataset, backend_from_url
+from threshold_sweep import sweep_thresholds
+
+
+def load_dataset(key, data, progress=None):
+    # Excel парсится один раз на содержимое файла, повторные загрузки читают Arrow-кэш с диска;
+    # даты уже разобраны при чтении книги
+    _, df = load_workbook(data, progress)
+    return FFADataset(df, key=key)
+
+
+@st.cache_resource
+def get_dataset_registry():
+    # Один датасет на файл для всех сессий процесса, простаивающие вытесняются
+    return DatasetRegistry()
+
+
+@st.cache_data
+def run_threshold_sweep(dataset_key, _dataset, start_date, end_date, low_grid, high_grid, horizon):
+    # Один выровненный ряд Ratio на весь перебор, результат кэшируется по параметрам
+    ratio_data = compute_ratio(_dataset.category_range('C5TC FACT', start_date, end_date),
+                               _dataset.category_range('P5TC FACT', start_date, end_date))
+    return sweep_thresholds(ratio_data['ArchiveDate'], ratio_data['Ratio'], low_grid, high_grid, horizon=horizon)
+
+
+@st.cache_resource
+def get_figure_cache():
+    # Общий на процесс кэш готовых PNG: одинаковые параметры у разных аналитиков не рисуются заново
+    return FigureCache()
+
+
+@st.cache_resource
+def get_archive_store():
+    # Локальный архив общий на процесс: дневной файл дописывается в него один раз для всех сессий
+    return ArchiveStore()
+
+
+@st.cache_resource
+def get_sql_backend():
+    # Подключение к базе из BDI_DATABASE_URL (по умолчанию локальный SQLite), одно на процесс
+    return backend_from_url()
+
+
+@st.cache_resource(max_entries=2)
+def get_sql_dataset(version):
+    # Новая версия данных в базе - новый датасет, кэш дат и категорий старой версии не нужен
+    return SQLDataset(get_sql_backend())
+
+
+@st.cache_resource
+def get_indicator_store():
+    # Общий на процесс кэш индикаторов: смена окон и слайдера не пересчитывает уже посчитанные ряды
+    return IndicatorStore()
+
+
+@st.cache_resource
+def get_compute_pool():
+    # Фоновые расчеты графика всех сессий процесса; готовые результаты переиспользуются по параметрам
+    return ComputePool()
+
+
+@st.cache_resource
+def get_accuracy_store():
+    # Таблицы точности прогнозов по версии датасета; дневной файл архива продлевает таблицу, а не строит заново
+    return AccuracyStore()
+
+
+st.markdown("""
+    <style>
+        .block-container {
+            max-width: 1300px;
+        }
+        .custom-column {
+            width: 80%;
+        }
+    </style>
+""", unsafe_allow_html=True)
+
+
+# Насколько назад искать ближайшую дату архива, если за выбранную данных нет
+NEAREST_DATE_TOLERANCE = timedelta(days=15)
+# Сколько секунд прогон ждет фоновый расчет, прежде чем показать прошлый результат, и период опроса
+COMPUTE_WAIT_SECONDS = 1.0
+COMPUTE_POLL_SECONDS = 0.5
+
+
+def empty_date_checker(dataset, selected_date):
+    return dataset.has_date('BFA Cape', selected_date)
+
+
+# --- Функция для обработки введенных порогов ---
+def parse_thresholds(text_input, default_values):
+    """Преобразует строку с порогами в список чисел."""
+    if not text_input.strip():
+        return []  # Возвращаем значения по умолчанию, если поле пустое
+    try:
+        # Разделяем по запятой, убираем пробелы и преобразуем в float
+        return [float(x.strip()) for x in text_input.split(',')]
+    except ValueError:
+        st.error(
+            f"Ошибка в формате порогов: '{text_input}'. Используйте числа, разделенные запятой (например: 0.75, 0.5).")
+        return None  # Возвращаем None в случае ошибки
+
+
+def parse_grid(text_input):
+    """Преобразует 'начало:конец:шаг' или список через запятую в сетку порогов."""
+    if ':' not in text_input:
+        return parse_thresholds(text_input, [])
+    try:
+        start, stop, step = [float(x.strip()) for x in text_input.split(':')]
+    except ValueError:
+        start = stop = step = None
+    if step is None or step <= 0 or stop < start:
+        st.error(f"Ошибка в формате сетки: '{text_input}'. Используйте начало:конец:шаг (например: 0.5:1.0:0.05).")
+        return None
+    return list(np.round(np.arange(start, stop + step / 2, step), 10))
+
+
+def parse_windows(text_input):
+    """Преобразует строку с окнами индикаторов в список целых чисел без повторов."""
+    if not text_input.strip():
+        return []
+    try:
+        windows = [int(x.strip()) for x in text_input.split(',')]
+    except ValueError:
+        windows = None
+    if windows is None or any(window < 1 for window in windows):
+        st.error(
+            f"Ошибка в формате окон: '{text_input}'. Используйте целые положительные числа через запятую (например: 20, 90).")
+        return None
+    return list(dict.fromkeys(windows))
+
+
+def parse_spread_input(text_input, categories):
+    """Разбирает спреды из текстового поля; None и сообщение об ошибке, если строка не разбирается."""
+    try:
+        spreads = parse_spreads(text_input)
+    except ValueError as error:
+        st.error(f"Ошибка в формате спредов: {error}")
+        return None
+    unknown = {category for spread in spreads for category in (spread.left, spread.right)} - set(categories)
+    if unknown:
+        st.error(f"Нет категорий для спредов: {', '.join(sorted(unknown))}")
+        return None
+    return spreads
+
+
+# Профилирование: один профайлер на прогон скрипта, метрики пишутся в лог в конце прогона
+if 'session_id' not in st.session_state:
+    st.session_state['session_id'] = uuid.uuid4().hex
+show_profiling = st.sidebar.checkbox("Показать профилирование", value=False)
+trace_memory = st.sidebar.checkbox("Замерять память (tracemalloc)", value=False, disabled=not show_profiling,
+                                   help="Замедляет расчет, включайте только для отладки")
+profiler = StageProfiler(interaction='rerun', session=st.session_state['session_id'],
+                         trace_memory=show_profiling and trace_memory)
+
+data_source = st.sidebar.radio("**Источник данных**", ["Excel-файл", "Локальный архив", "База данных (SQL)"])
+dataset = None
+
+if data_source == "Excel-файл":
+    # Загрузка файла
+    uploaded_file = st.file_uploader("Загрузите Excel-файл", type=["xlsx"])
+    if uploaded_file:
+        with profiler.stage('ingest', file_size=uploaded_file.size):
+            data = uploaded_file.getvalue()
+            data_key = content_hash(data)
+            progress_bar = st.empty()
+
+            def show_progress(done):
+                progress_bar.progress(done, text=f"Чтение файла: {done:.0%}")
+
+            dataset = get_dataset_registry().acquire(st.session_state['session_id'], data_key,
+                                                     lambda: load_dataset(data_key, data, show_progress))
+            progress_bar.empty()
+    else:
+        get_dataset_registry().release(st.session_state['session_id'])
+elif data_source == "База данных (SQL)":
+    # Выборки идут запросами с фильтрами в базу, в память попадают только нужные строки
+    get_dataset_registry().release(st.session_state['session_id'])
+    backend = get_sql_backend()
+    sql_file = st.sidebar.file_uploader("Файл для загрузки в базу", type=["xlsx"])
+    if sql_file and st.sidebar.button("Загрузить в базу"):
+        try:
+            with profiler.stage('sql_append', file_size=sql_file.size):
+                loaded_rows = backend.append(read_workbook(io.BytesIO(sql_file.getvalue())))
+        except ValueError as error:
+            st.sidebar.error(f"Файл не загружен: {error}")
+        else:
+            st.sidebar.success(f"Загружено строк: {loaded_rows}.")
+    version = backend.version()
+    if version is None:
+        st.info("База пуста. Загрузите в нее выгрузку в боковой панели.")
+    else:
+        dataset = get_sql_dataset(version)
+else:
+    # Архив пополняется дневными файлами (или один раз полной выгрузкой), история не перечитывается
+    archive = get_archive_store()
+    daily_file = st.sidebar.file_uploader("Дневной файл в архив", type=["xlsx"])
+    if daily_file and st.sidebar.button("Добавить в архив"):
+        try:
+            with profiler.stage('archive_append', file_size=daily_file.size):
+                append_result = archive.append_workbook(daily_file.getvalue(), get_indicator_store(),
+                                                         get_accuracy_store())
+        except ValueError as error:
+            st.sidebar.error(f"Файл не добавлен: {error}")
+        else:
+            st.session_state['archive_append'] = append_result
+            st.sidebar.success(
+                f"Добавлено строк: {append_result.added}, заменено: {append_result.replaced} "
+                f"(месяцы: {', '.join(append_result.months)}).")
+    get_dataset_registry().release(st.session_state['session_id'])
+    if archive.is_empty:
+        st.info("Архив пуст. Добавьте в него полную выгрузку или дневной файл в боковой панели.")
+    else:
+        with profiler.stage('archive_load'):
+            dataset = archive.dataset()
+
+col1, col2, col3 = st.columns([1.7, 1.2, 0.8])  # Немного изменил пропорции для новых полей
+
+if dataset is not None:
+    with col1:
+        bfa_dates = dataset.group_dates('BFA Cape')
+        min_date = pd.Timestamp(bfa_dates[0])
+        max_date = pd.Timestamp(bfa_dates[-1])
+
+        mode = st.radio("**Выберите режим**", ["Одна дата", "Несколько дат", "Месяц целиком"])
+
+        if mode == "Одна дата":
+            selected_date = st.date_input("**Выберите дату**", min_value=min_date, max_value=max_date)
+            selected_date = pd.to_datetime(selected_date)
+            if not empty_date_checker(dataset, selected_date):
+                st.write("⚠️ Данных за эту дату нет. Ищем ближайшую...")
+                nearest_date = dataset.nearest_date('BFA Cape', selected_date, direction='backward',
+                                                    tolerance=NEAREST_DATE_TOLERANCE)
+                if nearest_date is not None:
+                    selected_date = pd.Timestamp(nearest_date)
+                    st.write(f"✅ Выбрана ближайшая дата: {selected_date.strftime('%Y-%m-%d')}.")
+                else:
+                    st.write(f"⛔ Данные не найдены за последние {NEAREST_DATE_TOLERANCE.days} дней.")
+            selected_dates = [selected_date]
+
+        elif mode == "Несколько дат":
+            available_months = dataset.months('BFA Cape')
+            selected_months = st.multiselect("Выберите месяц", available_months)
+            available_dates = pd.DatetimeIndex(dataset.month_dates('BFA Cape', selected_months))
+            selected_dates = st.multiselect("Выберите даты", list(available_dates),
+                                            format_func=lambda x: x.strftime('%Y-%m-%d'))
+            if not selected_dates:
+                st.warning("⚠️ Выберите хотя бы одну дату.")
+                st.stop()
+
+        elif mode == "Месяц целиком":
+            available_months = dataset.months('BFA Cape')
+            default_month = available_months[1] if len(available_months) > 1 else (
+                available_months[0] if available_months else None)
+            selected_months = st.multiselect("Выберите месяц", available_months,
+                                             default=[default_month] if default_month else [])
+            selected_dates = list(pd.DatetimeIndex(dataset.month_dates('BFA Cape', selected_months)))
+
+        forecast_types = st.multiselect("**Выберите тип прогноза**",
+                                        ['Monthly Contract (MON)', 'Quarterly Contract (Q)',
+                                         'Calendar Year Contract (CAL)'],
+                                        default=['Monthly Contract (MON)'])
+        if not forecast_types:
+            st.warning("⚠️ Пожалуйста, выберите хотя бы один тип прогноза.")
+            st.stop()
+
+    with col2:
+        st.markdown("**Настройки индикаторов**")
+        sma_windows_input = st.text_input(
+            "Окна SMA (дней)",
+            "",
+            help="Введите окна через запятую, например: 20, 50, 90, 200"
+        )
+        rolling_std = st.checkbox("Std Dev вокруг SMA", value=False, disabled=not sma_windows_input.strip())
+        ewma_spans_input = st.text_input(
+            "Периоды EWMA (дней)",
+            "",
+            help="Введите периоды через запятую, например: 10, 30, 90"
+        )
+
+        # --- НОВЫЙ БЛОК ДЛЯ ПОРОГОВ ---
+        st.markdown("**Настройки сигналов для Ratio**")
+        low_thresholds_input = st.text_input(
+            "Нижние пороги (сигнал 'L')",
+            "0.75, 0.5",
+            help="Введите значения через запятую"
+        )
+        high_thresholds_input = st.text_input(
+            "Верхние пороги (сигнал 'S')",
+            "1.75, 2.0",
+            help="Введите значения через запятую"
+        )
+        # -------------------------------
+        spreads_input = st.text_area(
+            "Спреды (по одному на строку)",
+            "",
+            help="Отношение 'A / B' или разность 'A - B' с порогами, например:\n\n"
+                 "C5TC - P5TC; L: -2000; S: 5000\n\nC5TC / Brent; S: 300\n\n"
+                 "Короткие имена: C5TC, P5TC, Brent, MON1 (ближайший месячный контракт)"
+        )
+
+    with col3:
+        st.markdown("**Доп. настройки**")
+        average_forcast_mode = st.checkbox("Усреднить прогнозы", value=False)
+        average_forcast_mode_group = st.selectbox(
+            "Группировать по:",
+            options=[False, "Месяцам", "Месяца до кварталов"],
+            index=0,
+            disabled=not average_forcast_mode
+        )
+        chart_backend = st.radio(
+            "Движок графика",
+            options=["matplotlib", "plotly"],
+            format_func=lambda x: {"matplotlib": "Matplotlib (PNG)", "plotly": "Plotly (WebGL)"}[x],
+            help="Plotly прореживает длинные ряды до ширины экрана; для полного разрешения сузьте диапазон дат"
+        )
+
+    start_date, end_date = st.slider(
+        "**Выберите диапазон дат**",
+        min_value=min_date.date(),
+        max_value=max_date.date(),
+        value=(min_date.date(), max_date.date())
+    )
+
+    historical_data_types = st.multiselect("**Исторические данные**",
+                                           ['C5TC FACT', 'P5TC FACT', 'Brent Oil', 'C5TC / P5TC'],
+                                           default=['C5TC FACT', 'P5TC FACT',
+                                                    'C5TC / P5TC'])  # Добавил P5TC по умолчанию
+
+    if "C5TC / P5TC" in historical_data_types and (
+            'C5TC FACT' not in historical_data_types or 'P5TC FACT' not in historical_data_types):
+        st.warning("Для расчета 'C5TC / P5TC' необходимо выбрать 'C5TC FACT' и 'P5TC FACT'.")
+        st.stop()
+
+if dataset is not None:
+    low_thresholds = parse_thresholds(low_thresholds_input, [0.75, 0.5])
+    high_thresholds = parse_thresholds(high_thresholds_input, [1.75, 2.0])
+
+    sma_windows = parse_windows(sma_windows_input)
+    ewma_spans = parse_windows(ewma_spans_input)
+    spreads = parse_spread_input(spreads_input, list(dataset.categories) + [FRONT_MONTH])
+
+    if (low_thresholds is not None and high_thresholds is not None and sma_windows is not None
+            and ewma_spans is not None and spreads is not None and selected_dates):
+        plotter = FFAForecastPlotter(dataset,
+                                     sma_windows=sma_windows,
+                                     ewma_spans=ewma_spans,
+                                     std_windows=sma_windows if rolling_std else [],
+                                     indicator_store=get_indicator_store(),
+                                     figure_cache=get_figure_cache(),
+                                     backend=chart_backend,
+                                     profiler=profiler)
+
+        # Расчет идет в фоновом пуле: смена ввода снимает устаревшую задачу, а пока считается новая,
+        # показывается последний готовый результат
+        params = plotter.params(historical_data_types, forecast_types, selected_dates, start_date, end_date,
+                                average_forcast_mode, average_forcast_mode_group, low_thresholds, high_thresholds,
+                                spreads)
+        session_id = st.session_state['session_id']
+        compute_pool = get_compute_pool()
+        job_key = (dataset.key, params)
+
+        def compute_job(cancel, dataset=dataset, params=params, indicator_store=get_indicator_store()):
+            # Этапы расчета возвращаются вместе с результатом и попадают в замер первого прогона, который его показал
+            job_profiler = StageProfiler(interaction='background_compute', session=session_id)
+            result = compute_forecast(dataset, params, indicator_store, job_profiler, cancel)
+            return result, job_profiler.spans
+
+        future = compute_pool.submit(session_id, job_key, compute_job)
+        try:
+            with profiler.stage('compute_wait'):
+                forecast_result = compute_pool.wait(session_id, job_key, future, COMPUTE_WAIT_SECONDS)
+                previous_result = compute_pool.last_good(session_id, dataset.key)
+                if forecast_result is None and previous_result is None:
+                    # Показать пока нечего - ждем здесь, обновляя статус: на вызове st Streamlit
+                    # прерывает прогон, если пользователь успел изменить ввод
+                    status = st.empty()
+                    waited = COMPUTE_WAIT_SECONDS
+                    while forecast_result is None:
+                        status.info(f"Идет расчет... {waited:.0f} с")
+                        forecast_result = compute_pool.wait(session_id, job_key, future, COMPUTE_POLL_SECONDS)
+                        waited += COMPUTE_POLL_SECONDS
+                    status.empty()
+        except CancelledError:
+            # Задачу сняла более новая задача этой же сессии - этот прогон уже устарел
+            st.stop()
+
+        if forecast_result is None:
+            st.caption("⏳ Показан прошлый результат, идет пересчет по новым параметрам...")
+
+            @st.fragment(run_every=COMPUTE_POLL_SECONDS)
+            def poll_compute():
+                if future.done():
+                    st.rerun()
+
+            poll_compute()
+            forecast_result, _ = previous_result
+        else:
+            forecast_result, compute_spans = forecast_result
+            if compute_pool.fresh(session_id, job_key):
+                profiler.spans.extend(compute_spans)
+
+        # --- ИЗМЕНЕНИЕ 1: Присваиваем результат вызова переменной ---
+        final_signals = plotter.show(forecast_result)
+
+        # --- ИЗМЕНЕНИЕ 2: Выводим таблицу с сигналами под графиком ---
+        st.markdown("---")  # Горизонтальная линия для разделения
+        st.subheader("Сработавшие сигналы")
+
+        if not final_signals.empty:
+            # Выбираем и переименовываем нужные колонки для красивого вывода
+            display_df = final_signals[['ArchiveDate', 'Type', 'Threshold', 'Ratio']].copy()
+            display_df.rename(columns={
+                'ArchiveDate': 'Дата сигнала',
+                'Type': 'Тип (L/S)',
+                'Threshold': 'Пробитый порог',
+                'Ratio': 'Значение Ratio'
+            }, inplace=True)
+
+            # Форматируем дату и число для лучшей читаемости
+            display_df['Дата сигнала'] = display_df['Дата сигнала'].dt.strftime('%d-%m-%Y')
+            display_df['Значение Ratio'] = display_df['Значение Ratio'].map('{:,.2f}'.format)
+
+            st.dataframe(display_df, use_container_width=True)
+
+
+        else:
+            st.info("В выбранном диапазоне сигналов по заданным порогам не найдено.")
+
+        # --- Сигналы пользовательских спредов ---
+        for spread in plotter.result.spreads:
+            st.markdown(f"**Сигналы {spread.spec.name}**")
+            if spread.signals.empty:
+                st.info("Сигналов нет.")
+            else:
+                st.dataframe(spread.signals[['ArchiveDate', 'Type', 'Threshold', 'Ratio']].rename(
+                    columns={'Ratio': 'Значение'}), use_container_width=True)
+
+        # --- Сигналы по датам последнего дневного файла (только для локального архива) ---
+        append_result = st.session_state.get('archive_append')
+        if data_source == "Локальный архив" and append_result is not None and append_result.version == dataset.key:
+            # Состояние на начало дневного файла: Ratio и сигналы с начала предыдущего месяца
+            state_start = append_result.start_date.to_period('M').to_timestamp() - pd.DateOffset(months=1)
+            state_end = append_result.start_date - pd.Timedelta(days=1)
+            merged_state, signals_state = ratio_signals(dataset.category_range('C5TC FACT', state_start, state_end),
+                                                        dataset.category_range('P5TC FACT', state_start, state_end),
+                                                        low_thresholds, high_thresholds)
+            _, extended_signals = extend_ratio_signals(
+                merged_state, signals_state,
+                dataset.category_range('C5TC FACT', append_result.start_date),
+                dataset.category_range('P5TC FACT', append_result.start_date),
+                low_thresholds, high_thresholds)
+            new_signals = extended_signals[extended_signals['ArchiveDate'] >= append_result.start_date]
+            st.markdown(f"**Сигналы с {append_result.start_date.strftime('%d-%m-%Y')} (последний дневной файл)**")
+            if new_signals.empty:
+                st.info("Новых сигналов нет.")
+            else:
+                st.dataframe(new_signals[['ArchiveDate', 'Type', 'Threshold', 'Ratio']], use_container_width=True)
+
+        # --- Точность прогнозов: ошибка кривых FFA против среднего индекса за период контракта ---
+        with st.expander("Точность прогнозов FFA"):
+            accuracy_col1, accuracy_col2 = st.columns(2)
+            accuracy_by = accuracy_col1.radio("Группировать по", ["Горизонт", "Контракт"], horizontal=True)
+            settled_only = accuracy_col2.checkbox("Только закрытые периоды", value=True,
+                                                  help="Контракты, чей период уже полностью есть в данных индекса")
+            # Таблица строится в фоновом пуле (своя очередь сессии, чтобы не снимать расчет графика),
+            # прогон страницы ее не ждет
+            accuracy_session, accuracy_key = (session_id, 'accuracy'), ('accuracy', dataset.key)
+            accuracy_future = compute_pool.submit(
+                accuracy_session, accuracy_key,
+                lambda cancel, dataset=dataset, accuracy_store=get_accuracy_store(): accuracy_store.get(dataset))
+            accuracy = compute_pool.wait(accuracy_session, accuracy_key, accuracy_future, 0)
+            if accuracy is None:
+                st.info("Таблица точности строится в фоне...")
+
+                @st.fragment(run_every=COMPUTE_POLL_SECONDS)
+                def poll_accuracy():
+                    if accuracy_future.done():
+                        st.rerun()
+
+                poll_accuracy()
+            else:
+                with profiler.stage('forecast_accuracy'):
+                    accuracy_df = accuracy.summary(
+                        by=('Category', 'HorizonMonths' if accuracy_by == "Горизонт" else 'Index_Label'),
+                        start_date=start_date, end_date=end_date, settled_only=settled_only)
+                accuracy_df = accuracy_df[accuracy_df['Category'].isin(forecast_types)]
+                st.caption(f"Прогнозы с датами архива {start_date.strftime('%d-%m-%Y')} - "
+                           f"{end_date.strftime('%d-%m-%Y')}; ошибка = прогноз - факт.")
+                if accuracy_df.empty:
+                    st.info("Нет прогнозов с рассчитанным фактом в выбранном диапазоне.")
+                else:
+                    st.dataframe(accuracy_df.rename(columns={
+                        'Category': 'Тип прогноза',
+                        'HorizonMonths': 'Горизонт (мес.)',
+                        'Index_Label': 'Контракт',
+                        'Points': 'Точек',
+                        'Bias': 'Смещение',
+                        'MAPE': 'MAPE',
+                        'SpotMAE': 'MAE "спот"',
+                    }).style.format({'Смещение': '{:,.0f}', 'MAE': '{:,.0f}', 'RMSE': '{:,.0f}', 'MAPE': '{:.1%}',
+                                     'MAE "спот"': '{:,.0f}'}), use_container_width=True)
+
+        # --- Перебор порогов: сводка по сетке нижних/верхних порогов ---
+        with st.expander("Перебор порогов (бэктест сигналов C5TC / P5TC)"):
+            sweep_col1, sweep_col2, sweep_col3 = st.columns(3)
+            low_grid_input = sweep_col1.text_input(
+                "Сетка нижних порогов", "0.5:1.0:0.02",
+                help="Диапазон в виде начало:конец:шаг или значения через запятую"
+            )
+            high_grid_input = sweep_col2.text_input(
+                "Сетка верхних порогов", "1.2:2.5:0.05",
+                help="Диапазон в виде начало:конец:шаг или значения через запятую"
+            )
+            horizon = sweep_col3.number_input("Горизонт доходности (дней)", min_value=1, value=20, step=1)
+
+            if st.button("Запустить перебор"):
+                low_grid = parse_grid(low_grid_input)
+                high_grid = parse_grid(high_grid_input)
+                if low_grid is not None and high_grid is not None:
+                    profiler.interaction = 'threshold_sweep'
+                    with profiler.stage('threshold_sweep', grid=len(low_grid) * len(high_grid)):
+                        sweep_df = run_threshold_sweep(dataset.key, dataset, start_date, end_date,
+                                                       tuple(low_grid), tuple(high_grid), int(horizon))
+                    if sweep_df.empty:
+                        st.info("Нет данных C5TC / P5TC в выбранном диапазоне.")
+                    else:
+                        st.dataframe(sweep_df.rename(columns={
+                            'Low': 'Нижний порог',
+                            'High': 'Верхний порог',
+                            'Signals': 'Сигналов',
+                            'L_Signals': 'Сигналов L',
+                            'S_Signals': 'Сигналов S',
+                            'MeanReturn': 'Средняя доходность',
+                            'StdReturn': 'Std доходности',
+                            'HitRate': 'Доля прибыльных',
+                            'TotalReturn': 'Суммарная доходность',
+                        }), use_container_width=True)
+
+if profiler.spans:
+    profiler.export()
+    if show_profiling:
+        st.sidebar.markdown(f"**Этапы прогона** ({profiler.total_seconds * 1000:.0f} мс)")
+        st.sidebar.dataframe(profiler.as_frame(), use_container_width=True, hide_index=True)
+        st.sidebar.markdown("**Датасеты в памяти процесса**")
+        st.sidebar.dataframe(get_dataset_registry().stats(), use_container_width=True, hide_index=True)
@@ -0,0 +1,210 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from data_cache import read_workbook
+from ffa_dataset import STRING_COLUMNS, FFADataset
+
+# Каталог локального архива, можно переопределить через переменную окружения
+STORE_DIR = os.environ.get(
+    'BDI_STORE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.bdi_store')
+)
+
+# Колонки, которые хранятся в архиве (остальные колонки выгрузки приложению не нужны)
+ARCHIVE_COLUMNS = ['Category', 'GroupDesc', 'ArchiveDate', 'StartDate', 'Index_Label', 'RouteAverage']
+# Одна котировка: повторная строка с тем же ключом заменяет старую
+ARCHIVE_KEY = ['ArchiveDate', 'Category', 'Index_Label']
+
+_SCHEMA = pa.schema([
+    ('Category', pa.string()),
+    ('GroupDesc', pa.string()),
+    ('ArchiveDate', pa.timestamp('ns')),
+    ('StartDate', pa.timestamp('ns')),
+    ('Index_Label', pa.string()),
+    ('RouteAverage', pa.float64()),
+])
+_MANIFEST = '_manifest.json'
+
+
+@dataclass
+class AppendResult:
+    version: str
+    rows: int
+    added: int
+    replaced: int
+    months: list = field(default_factory=list)
+    start_date: pd.Timestamp = None
+    end_date: pd.Timestamp = None
+
+
+def validate_rows(df):
+    """
+    Проверяет и приводит строки выгрузки к схеме архива.
+    ValueError, если нет нужных колонок или у строк нет даты архива / категории.
+    """
+    missing = [col for col in ARCHIVE_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"В файле нет колонок: {', '.join(missing)}")
+    rows = df[ARCHIVE_COLUMNS].copy()
+    for col in ('ArchiveDate', 'StartDate'):
+        rows[col] = pd.to_datetime(rows[col], errors='coerce')
+    rows['RouteAverage'] = pd.to_numeric(rows['RouteAverage'], errors='coerce')
+    invalid = rows['ArchiveDate'].isna() | rows['Category'].isna()
+    if invalid.any():
+        raise ValueError(f"Строк без ArchiveDate или Category: {int(invalid.sum())}")
+    for col in STRING_COLUMNS:
+        rows[col] = rows[col].where(rows[col].isna(), rows[col].astype(str))
+    return rows.drop_duplicates(ARCHIVE_KEY, keep='last').reset_index(drop=True)
+
+
+class ArchiveStore:
+    """
+    Локальный архив котировок: Parquet по месяцам (month=YYYY-MM/part.parquet) плюс манифест с версией.
+    Дневной файл переписывает только партиции своих месяцев, а загруженный в память FFADataset
+    и кэш индикаторов продлеваются на новые строки без перечитывания всей истории.
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._dataset = None
+        self._manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        path = os.path.join(self.root, _MANIFEST)
+        if not os.path.exists(path):
+            return {'version': None, 'rows': 0, 'months': []}
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+
+    def _write_manifest(self, manifest):
+        path = os.path.join(self.root, _MANIFEST)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._manifest = manifest
+
+    @property
+    def version(self):
+        return self._manifest['version']
+
+    @property
+    def is_empty(self):
+        return self.version is None
+
+    def _month_path(self, month):
+        return os.path.join(self.root, f'month={month}', 'part.parquet')
+
+    def _read_month(self, month):
+        path = self._month_path(month)
+        if not os.path.exists(path):
+            return None
+        return pq.read_table(path, schema=_SCHEMA).to_pandas()
+
+    def _write_month(self, month, rows):
+        path = self._month_path(month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Временный файл в каталоге с точкой, чтобы его не подхватило чтение датасета
+        tmp_dir = os.path.join(self.root, '.tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(tmp_dir, f'{month}.{os.getpid()}.parquet')
+        pq.write_table(pa.Table.from_pandas(rows, schema=_SCHEMA, preserve_index=False), tmp_path)
+        os.replace(tmp_path, path)
+
+    def load(self, since=None, categories=None):
+        """
+        История архива одним DataFrame; since - только даты архива позже since, categories - только эти категории.
+        Фильтры передаются в Parquet, поэтому группы строк вне диапазона не читаются.
+        """
+        if self.is_empty:
+            return _SCHEMA.empty_table().to_pandas()
+        source, condition = self.root, None
+        if since is not None:
+            # Партиции месяцев раньше since не открываются вовсе
+            since = pd.Timestamp(since)
+            first_month = since.strftime('%Y-%m')
+            source = [self._month_path(month) for month in self._manifest['months'] if month >= first_month]
+            if not source:
+                return _SCHEMA.empty_table().to_pandas()
+            condition = ds.field('ArchiveDate') > pa.scalar(np.datetime64(since, 'ns'), pa.timestamp('ns'))
+        if categories is not None:
+            category_filter = ds.field('Category').isin(list(categories))
+            condition = category_filter if condition is None else condition & category_filter
+        table = ds.dataset(source, format='parquet', schema=_SCHEMA).to_table(filter=condition)
+        return table.to_pandas()
+
+    def dataset(self):
+        """FFADataset текущей версии архива (ключ датасета - версия архива)."""
+        with self._lock:
+            if self._dataset is None or self._dataset.key != self.version:
+                self._dataset = FFADataset(self.load(), key=self.version)
+            return self._dataset
+
+    def append(self, df, indicator_store=None, accuracy_store=None):
+        """
+        Добавляет строки в архив: повторы по (ArchiveDate, Category, Index_Label) заменяют старые.
+        Переписываются только партиции месяцев из df. Если история уже загружена в память,
+        FFADataset продлевается на новые строки, indicator_store досчитывает индикаторы от последнего значения,
+        а accuracy_store - таблицу точности прогнозов с первой даты файла.
+        """
+        rows = validate_rows(df)
+        if rows.empty:
+            raise ValueError("В файле нет строк для архива")
+        months = rows['ArchiveDate'].dt.strftime('%Y-%m')
+        with self._lock:
+            replaced = 0
+            for month, part in rows.groupby(months, sort=True):
+                existing = self._read_month(month)
+                if existing is None:
+                    merged = part
+                else:
+                    merged = pd.concat([existing, part], ignore_index=True).drop_duplicates(ARCHIVE_KEY, keep='last')
+                    replaced += len(existing) + len(part) - len(merged)
+                self._write_month(month, merged.sort_values(['Category', 'ArchiveDate'], kind='stable'))
+
+            digest = hashlib.sha256((self.version or '').encode())
+            digest.update(pd.util.hash_pandas_object(rows, index=False).to_numpy().tobytes())
+            last_date = rows['ArchiveDate'].max()
+            if self._manifest.get('last_archive_date'):
+                last_date = max(last_date, pd.Timestamp(self._manifest['last_archive_date']))
+            manifest = {
+                'version': digest.hexdigest(),
+                'rows': self._manifest['rows'] + len(rows) - replaced,
+                'months': sorted(set(self._manifest['months']) | set(months)),
+                'last_archive_date': last_date.isoformat(),
+            }
+            self._write_manifest(manifest)
+
+            previous = self._dataset
+            if previous is not None:
+                self._dataset = previous.extend(rows, key=self.version, on=ARCHIVE_KEY)
+                if indicator_store is not None:
+                    indicator_store.extend(previous, self._dataset)
+                if accuracy_store is not None:
+                    accuracy_store.extend(previous, self._dataset, rows['ArchiveDate'].min())
+
+        return AppendResult(version=self.version, rows=len(rows), added=len(rows) - replaced, replaced=replaced,
+                            months=sorted(set(months)), start_date=rows['ArchiveDate'].min(),
+                            end_date=rows['ArchiveDate'].max())
+
+    def append_workbook(self, data, indicator_store=None, accuracy_store=None):
+        """append() для байтов xlsx-файла (дневного или полной выгрузки)."""
+        return self.append(read_workbook(io.BytesIO(data)), indicator_store, accuracy_store)
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self._dataset = None
+            self._manifest = self._read_manifest()
@@ -1,436 +1,264 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import numpy as np
-import streamlit as st
-from collections import Counter
-
-
-class FFAForecastPlotter:
-    def __init__(self, df, sma_90, sma_200, ewma_30, ewma_90, rolling_std_90, rolling_std_200):
-        self.df = df.copy()
-        self.combined_subsets = []
-        self.sma_90 = sma_90
-        self.sma_200 = sma_200
-        self.ewma_30 = ewma_30
-        self.ewma_90 = ewma_90
-        self.rolling_std_90 = rolling_std_90
-        self.rolling_std_200 = rolling_std_200
-
-    def _compute_indicators(
-            self,
-            ax1,
-            historical_data_types, start_datetime, end_datetime,
-            data_flag=False):
-        if self.sma_90: self.df['SMA_90'] = np.nan
-        if self.sma_200: self.df['SMA_200'] = np.nan
-        if self.ewma_30: self.df['EWMA_30'] = np.nan
-        if self.ewma_90: self.df['EWMA_90'] = np.nan
-        if self.rolling_std_90: self.df['Rolling_Std_90'] = np.nan
-        if self.rolling_std_200: self.df['Rolling_Std_200'] = np.nan
-        # Если в будущем захочу рисовать не только P5TC
-        if not data_flag:
-            historical_data_types = ['C5TC FACT']
-
-        for category in historical_data_types:
-            subset = self.df[self.df['Category'] == category].copy()
-            subset = subset.sort_values('ArchiveDate')
-
-            # 90-day SMA
-            if self.sma_90:
-                sma_90_values = subset['RouteAverage'].rolling(window=90, min_periods=1).mean()
-                self.df.loc[self.df['Category'] == category, 'SMA_90'] = sma_90_values.values
-                print(f"Plotting SMA_90 for category {category}")
-
-                # Создаём датафрейм для фильтрации
-                sma_90_df = pd.DataFrame({
-                    'ArchiveDate': subset['ArchiveDate'],
-                    'SMA_90': sma_90_values
-                })
-
-                # Если считаем стандартное отклонение
-                if self.rolling_std_90:
-                    rolling_std_90_values = subset['RouteAverage'].rolling(window=90).std()
-                    self.df.loc[self.df['Category'] == category, 'Rolling_Std_90'] = rolling_std_90_values.values
-
-                    sma_90_df['Rolling_Std_90'] = rolling_std_90_values
-
-                # Фильтруем по диапазону дат
-                sma_90_df_filtered = sma_90_df[
-                    (sma_90_df['ArchiveDate'] >= start_datetime) &
-                    (sma_90_df['ArchiveDate'] <= end_datetime)
-                    ]
-
-                # Линия SMA
-                ax1.plot(sma_90_df_filtered['ArchiveDate'], sma_90_df_filtered['SMA_90'],
-                         'g--', alpha=0.6, label=f'90-day SMA ({category})')
-
-                # Площадь стандартного отклонения
-                if self.rolling_std_90:
-                    ax1.fill_between(sma_90_df_filtered['ArchiveDate'],
-                                     sma_90_df_filtered['SMA_90'] - sma_90_df_filtered['Rolling_Std_90'],
-                                     sma_90_df_filtered['SMA_90'] + sma_90_df_filtered['Rolling_Std_90'],
-                                     color='yellow', alpha=0.2, label='90-day Rolling Std Area')
-
-            # 200-day SMA
-            if self.sma_200:
-                sma_200_values = subset['RouteAverage'].rolling(window=200, min_periods=1).mean()
-                self.df.loc[self.df['Category'] == category, 'SMA_200'] = sma_200_values.values
-                print(f"Plotting SMA_200 for category {category}")
-
-                # Собираем датафрейм для фильтрации
-                sma_200_df = pd.DataFrame({
-                    'ArchiveDate': subset['ArchiveDate'],
-                    'SMA_200': sma_200_values
-                })
-
-                # Если считаем rolling std
-                if self.rolling_std_200:
-                    rolling_std_200_values = subset['RouteAverage'].rolling(window=200).std()
-                    self.df.loc[self.df['Category'] == category, 'Rolling_Std_200'] = rolling_std_200_values.values
-
-                    sma_200_df['Rolling_Std_200'] = rolling_std_200_values
-
-                # Фильтрация по дате
-                sma_200_df_filtered = sma_200_df[
-                    (sma_200_df['ArchiveDate'] >= start_datetime) &
-                    (sma_200_df['ArchiveDate'] <= end_datetime)
-                    ]
-
-                # Линия SMA
-                ax1.plot(sma_200_df_filtered['ArchiveDate'], sma_200_df_filtered['SMA_200'],
-                         'b--', alpha=0.6, label=f'200-day SMA ({category})')
-
-                # Площадь стандартного отклонения
-                if self.rolling_std_200:
-                    ax1.fill_between(sma_200_df_filtered['ArchiveDate'],
-                                     sma_200_df_filtered['SMA_200'] - sma_200_df_filtered['Rolling_Std_200'],
-                                     sma_200_df_filtered['SMA_200'] + sma_200_df_filtered['Rolling_Std_200'],
-                                     color='black', alpha=0.2, label='200-day Rolling Std Area')
-
-            # 30-day EWMA
-            if self.ewma_30:
-                ewma_30_values = subset['RouteAverage'].ewm(span=30, adjust=False).mean()
-                self.df.loc[self.df['Category'] == category, 'EWMA_30'] = ewma_30_values.values
-                # Создаем DataFrame с датами и значениями EWMA
-                ewma_30_df = pd.DataFrame({
-                    'ArchiveDate': subset['ArchiveDate'],
-                    'EWMA_30': ewma_30_values
-                })
-                # Фильтруем по датам
-                ewma_30_df_filtered = ewma_30_df[
-                    (ewma_30_df['ArchiveDate'] >= start_datetime) &
-                    (ewma_30_df['ArchiveDate'] <= end_datetime)
-                    ]
-                print(f"Plotting EWMA_30 for category {category}")  # Добавил вывод
-                ax1.plot(ewma_30_df_filtered['ArchiveDate'], ewma_30_df_filtered['EWMA_30'], 'r-', alpha=0.6,
-                         label=f'30-day EWMA ({category})')
-
-            # 90-day EWMA
-            if self.ewma_90:
-                ewma_90_values = subset['RouteAverage'].ewm(span=90, adjust=False).mean()
-                self.df.loc[self.df['Category'] == category, 'EWMA_90'] = ewma_90_values.values
-                ewma_90_df = pd.DataFrame({
-                    'ArchiveDate': subset['ArchiveDate'],
-                    'EWMA_90': ewma_90_values
-                })
-                # Фильтруем по датам
-                ewma_90_df_filtered = ewma_90_df[
-                    (ewma_90_df['ArchiveDate'] >= start_datetime) &
-                    (ewma_90_df['ArchiveDate'] <= end_datetime)
-                    ]
-                print(f"Plotting EWMA_90 for category {category}")  # Добавил вывод
-                ax1.plot(ewma_90_df_filtered['ArchiveDate'], ewma_90_df_filtered['EWMA_90'], 'm-', alpha=0.6,
-                         label=f'90-day EWMA ({category})')
-
-    def _plot_historical_data(self, ax1, actual_data_period, historical_data_types, low_thresholds,
-                              high_thresholds):
-        if low_thresholds is None:
-            low_thresholds = []
-        if high_thresholds is None:
-            high_thresholds = []
-
-        # Инициализируем DataFrame для возврата в самом начале
-        final_signals_to_display = pd.DataFrame()
-
-        for data_type in historical_data_types:
-            category_data = actual_data_period[actual_data_period['Category'] == data_type]
-            if data_type == "Brent Oil":
-                ax2 = ax1.twinx()
-                ax2.plot(category_data['ArchiveDate'], category_data['RouteAverage'], 'g-', label='Brent Oil')
-                ax2.set_ylabel("Brent Oil Price", color='g')
-                ax2.set_ylim(
-                    actual_data_period[actual_data_period['Category'] == "Brent Oil"]['RouteAverage'].min() * 0.9,
-                    actual_data_period[actual_data_period['Category'] == "Brent Oil"]['RouteAverage'].max() * 1.1)
-                ax1.plot([], [], 'g-', label='Brent Oil (Second Y-Axis)')
-
-            elif data_type == "C5TC / P5TC":
-                ax2 = ax1.twinx()
-                c5tc_data = actual_data_period[actual_data_period['Category'] == 'C5TC FACT']
-                p5tc_data = actual_data_period[actual_data_period['Category'] == 'P5TC FACT']
-
-                if c5tc_data.empty or p5tc_data.empty:
-                    continue
-
-                merged_data = pd.merge(c5tc_data[['ArchiveDate', 'RouteAverage']],
-                                       p5tc_data[['ArchiveDate', 'RouteAverage']], on='ArchiveDate',
-                                       suffixes=('_C5TC', '_P5TC'))
-                merged_data['Ratio'] = merged_data['RouteAverage_C5TC'] / merged_data['RouteAverage_P5TC']
-
-                ax2.bar(merged_data['ArchiveDate'],
-                        merged_data['Ratio'],
-                        color=['g' if x > 1 else 'r' for x in merged_data['Ratio']],
-                        alpha=0.3)
-
-                merged_data['Ratio_prev'] = merged_data['Ratio'].shift(1)
-                merged_data.dropna(inplace=True)
-
-                all_signals = []
-                for threshold in low_thresholds:
-                    signals = merged_data[
-                        (merged_data['Ratio'] < threshold) & (merged_data['Ratio_prev'] >= threshold)].copy()
-                    if not signals.empty:
-                        signals['Type'] = 'L'
-                        signals['Threshold'] = threshold
-                        all_signals.append(signals)
-
-                for threshold in high_thresholds:
-                    signals = merged_data[
-                        (merged_data['Ratio'] > threshold) & (merged_data['Ratio_prev'] <= threshold)].copy()
-                    if not signals.empty:
-                        signals['Type'] = 'S'
-                        signals['Threshold'] = threshold
-                        all_signals.append(signals)
-
-                if all_signals:
-                    final_signals_df = pd.concat(all_signals, ignore_index=True)
-                    final_signals_df['YearMonth'] = final_signals_df['ArchiveDate'].dt.to_period('M')
-                    final_signals_df.sort_values('ArchiveDate', inplace=True)
-
-                    filtered_signals = final_signals_df.drop_duplicates(subset=['YearMonth', 'Type'], keep='first')
-
-                    # Присваиваем результат переменной, которую вернем в конце
-                    final_signals_to_display = filtered_signals
-                else:
-                    filtered_signals = pd.DataFrame()
-
-                if not filtered_signals.empty:
-                    low_signals_to_plot = filtered_signals[filtered_signals['Type'] == 'L']
-                    if not low_signals_to_plot.empty:
-                        ax2.scatter(low_signals_to_plot['ArchiveDate'], low_signals_to_plot['Ratio'],
-                                    color='blue', marker='^', s=120, zorder=5,
-                                    label=f'Low Signal (пробой вниз)')
-                        for i, point in low_signals_to_plot.iterrows():
-                            ax2.text(point['ArchiveDate'], point['Ratio'] + 0.05, f"L\n({point['Threshold']})",
-                                     ha='center', va='bottom', color='blue', fontsize=10, fontweight='bold')
-
-                    high_signals_to_plot = filtered_signals[filtered_signals['Type'] == 'S']
-                    if not high_signals_to_plot.empty:
-                        ax2.scatter(high_signals_to_plot['ArchiveDate'], high_signals_to_plot['Ratio'],
-                                    color='purple', marker='v', s=120, zorder=5,
-                                    label=f'High Signal (пробой вверх)')
-                        for i, point in high_signals_to_plot.iterrows():
-                            ax2.text(point['ArchiveDate'], point['Ratio'] - 0.05, f"S\n({point['Threshold']})",
-                                     ha='center', va='top', color='purple', fontsize=10, fontweight='bold')
-
-                ax1.plot([], [], 'g-', label='C5TC / P5TC Ratio')
-                ax2.set_ylabel("C5TC / P5TC Ratio", color='g')
-                if not merged_data.empty:
-                    ax2.set_ylim(min(merged_data['Ratio']) * 0.85, max(merged_data['Ratio']) * 1.15)
-            else:
-                ax1.plot(category_data['ArchiveDate'], category_data['RouteAverage'], label=f'Actual ({data_type})')
-
-        # Гарантированный возврат DataFrame в конце функции
-        return final_signals_to_display
-
-    def _plot_forecasts(self, ax1, forecast_types, dates, average_forcast_mode, average_forcast_mode_group):
-        self.combined_subsets.clear()
-
-        category_colors = {
-            'Monthly Contract (MON)': 'blue',
-            'Quarterly Contract (Q)': 'green',
-            'Calendar Year Contract (CAL)': 'red'
-        }
-
-        extra_colors = ['orange', 'purple', 'brown', 'pink', 'cyan', 'magenta']
-        for i, cat in enumerate(forecast_types):
-            if cat not in category_colors:
-                category_colors[cat] = extra_colors[i % len(extra_colors)]
-
-        if len(dates) > 9 and not average_forcast_mode:
-            self.show_legend = False
-
-        for date in dates:
-            forecast_data = self.df[self.df['ArchiveDate'] == date]
-
-            for category in forecast_types:
-                subset = forecast_data[forecast_data['Category'] == category]
-                self.combined_subsets.append(
-                    subset[['Category', 'ArchiveDate', 'RouteAverage', 'Index_Label', 'StartDate']].copy()
-                )
-
-                if not average_forcast_mode:
-                    ax1.plot(subset['StartDate'], subset['RouteAverage'], 'o-',
-                             color=category_colors[category],
-                             label=f"{category} ({date.strftime('%Y-%m-%d')})",
-                             alpha=0.8)
-
-        # --- Средний режим ---
-        if average_forcast_mode:
-            combined_df = pd.concat(self.combined_subsets, ignore_index=True)
-
-            # Добавим колонку MonthYear
-            combined_df['MonthYear'] = combined_df['StartDate'].dt.to_period('M')
-            combined_df['QuarterStart'] = combined_df['StartDate'].dt.to_period('Q').dt.start_time
-
-            for category in forecast_types:
-                cat_df = combined_df[combined_df['Category'] == category]
-                print(category)
-                if cat_df.empty:
-                    continue
-                if average_forcast_mode_group == "Месяца до кварталов" and category == 'Monthly Contract (MON)':
-                    print("start")
-                    # Создаем столбец с началом квартала
-                    cat_df['QuarterStart'] = cat_df['StartDate'].apply(
-                        lambda x: pd.Timestamp(year=x.year, month=((x.month - 1) // 3) * 3 + 1, day=1))
-
-                    # Группируем по ArchiveDate
-                    grouped = cat_df.groupby('ArchiveDate')
-
-                    # Словарь для хранения данных по кварталам
-                    seen_quarter_sets = {}
-
-                    for archive_date, group in grouped:
-                        # Определяем квартал для каждой строки
-                        quarter_set = tuple(sorted(group['QuarterStart'].astype(str).unique()))
-
-                        # Принт для отладки
-                        print(f"ArchiveDate: {archive_date} -> quarter_set: {quarter_set}")
-
-                        # Убираем из quarter_set лишние кварталы, если их несколько
-                        if len(quarter_set) > 1:
-                            # Берем только первый квартал (по логике, это и есть нужный квартал)
-                            quarter_set = (quarter_set[0],)
-                            print(f"Warning: More than one quarter for {archive_date}, using the first one.")
-
-                        if quarter_set not in seen_quarter_sets:
-                            seen_quarter_sets[quarter_set] = []
-                        seen_quarter_sets[quarter_set].append(group)
-
-                    # Проверим, сколько данных собралось в каждом квартале
-                    print(f"Total quarters: {len(seen_quarter_sets)}")
-
-                    for quarter_set, group_list in seen_quarter_sets.items():
-                        # Объединяем все данные по кварталу
-                        merged = pd.concat(group_list)
-                        print(f"Quarter: {quarter_set[0]} -> Merged data count: {len(merged)}")
-
-                        # Сортируем по дате
-                        merged['StartDate'] = merged['StartDate'].astype('datetime64[ns]')
-
-                        # Группируем по дате и усредняем значения
-                        avg_df = merged.groupby('StartDate', as_index=False)['RouteAverage'].mean()
-                        avg_df = avg_df.sort_values('StartDate')
-
-                        # Определяем метку для квартала
-                        quarter_label = quarter_set[0] if quarter_set else "?"
-                        quarter_dt = pd.to_datetime(quarter_label)
-                        quarter_num = (quarter_dt.month - 1) // 3 + 1
-                        label = f"{category} - {quarter_dt.year}-Q{quarter_num}"
-
-                        # Рисуем одну линию для всего квартала
-                        ax1.plot(avg_df['StartDate'], avg_df['RouteAverage'], '--',
-                                 color=category_colors[category],
-                                 label=label,
-                                 linewidth=2)
-
-                        print(f"Quarter label: {label}, Number of points in avg_df: {len(avg_df)}")
-
-                elif average_forcast_mode_group == "Месяцам" or category != 'Monthly Contract (MON)':
-                    # Группируем по ArchiveDate
-                    grouped = cat_df.groupby('ArchiveDate')
-
-                    seen_month_sets = {}
-
-                    for archive_date, group in grouped:
-                        month_set = tuple(sorted(group['MonthYear'].astype(str)))
-                        if month_set not in seen_month_sets:
-                            seen_month_sets[month_set] = []
-                        seen_month_sets[month_set].append(group)
-
-                    for month_set, group_list in seen_month_sets.items():
-                        if len(group_list) > 1:
-                            merged = pd.concat(group_list)
-                            # Убедимся, что отсортировано по дате
-                            month_label = month_set[0] if month_set else "?"
-                            merged['StartDate'] = merged['StartDate'].astype('datetime64[ns]')
-                            avg_df = merged.groupby('StartDate', as_index=False)['RouteAverage'].mean()
-                            avg_df = avg_df.sort_values('StartDate')
-                            ax1.plot(avg_df['StartDate'], avg_df['RouteAverage'], '--',
-                                     color=category_colors[category],
-                                     label=f"{category} - {month_label}",
-                                     linewidth=2)
-                else:
-                    # Обычное усреднение по StartDate
-                    avg_df = cat_df.groupby('StartDate', as_index=False)['RouteAverage'].mean()
-                    avg_df = avg_df.sort_values('StartDate')
-                    ax1.plot(avg_df['StartDate'], avg_df['RouteAverage'], '--',
-                             color=category_colors[category],
-                             label=f"{category} (Average)",
-                             linewidth=2)
-
-    def _finalize_plot(self, ax1):
-        if getattr(self, 'show_legend', True):
-            ax1.legend(loc='upper right')
-        ax1.set_title("FFA Forecast vs Actual", fontsize=16, color='darkblue')
-        ax1.set_xlabel("Дата", fontsize=12, fontweight='light')
-        ax1.set_ylabel("Route Average", fontsize=12, fontweight='light')
-        ax1.grid(True, which='both', linestyle='--', linewidth=0.5, alpha=0.8)
-        ax1.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
-        ax1.xaxis.set_major_locator(mdates.MonthLocator(interval=2))
-        plt.xticks(rotation=45)
-
-    def _prepare_combined_dataframe(self):
-        combined_df = pd.concat(self.combined_subsets, ignore_index=True)
-        combined_df['ArchiveDate'] = combined_df['ArchiveDate'].dt.strftime('%Y-%m-%d')
-        combined_df['Index_Label'] = combined_df['Index_Label'].str.split("_").str[1]
-        # Теперь вы можете использовать combined_df по своему усмотрению
-        unique_values = combined_df['Category'].unique()
-
-        for value in unique_values:
-            filtered_df = combined_df[combined_df['Category'] == value]
-            st.subheader(value)
-            df_cleaned = filtered_df.drop(columns=['Category']).sort_values(by='StartDate')
-            index_label_startdate_pairs = list(zip(df_cleaned['Index_Label'], df_cleaned['StartDate']))
-            sorted_index_labels = list(dict.fromkeys([pair[0] for pair in index_label_startdate_pairs]))
-            # Делаем pivot, чтобы 'Index_Label' стал столбцами
-            df_pivoted = df_cleaned.pivot(index='ArchiveDate', columns='Index_Label', values='RouteAverage')[
-                sorted_index_labels]
-            # Выводим результат
-            st.dataframe(df_pivoted, width=1000)
-
-    def plot_forecast(self, historical_data_types, forecast_types, dates, start_date, end_date, average_forcast_mode,
-                      average_forcast_mode_group, low_thresholds, high_thresholds):
-        fig, ax1 = plt.subplots(figsize=(16, 8))
-        start_datetime = pd.to_datetime(start_date)
-        end_datetime = pd.to_datetime(end_date)
-        actual_data_period = self.df[
-            (self.df['Category'].isin(historical_data_types)) &
-            (self.df['ArchiveDate'] >= start_datetime) &
-            (self.df['ArchiveDate'] <= end_datetime)
-            ]
-        fig.autofmt_xdate()
-
-        # --- ИСПРАВЛЕНИЕ: ОДИН вызов, результат которого сохраняется ---
-        triggered_signals_df = self._plot_historical_data(ax1, actual_data_period, historical_data_types,
-                                                          low_thresholds, high_thresholds)
-
-        # Остальные вызовы
-        self._plot_forecasts(ax1, forecast_types, dates, average_forcast_mode, average_forcast_mode_group)
-        self._compute_indicators(ax1, historical_data_types, start_datetime, end_datetime)
-        self._finalize_plot(ax1)
-        st.pyplot(plt, clear_figure=True)
-        self._prepare_combined_dataframe()
-
-        # --- ИСПРАВЛЕНИЕ: Возвращаем полученный DataFrame ---
-        return triggered_signals_df
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+import numpy as np
+import streamlit as st
+from matplotlib.collections import PolyCollection
+from chart_styles import (EWMA_COLORS, SMA_COLORS, STD_COLORS, category_colors,
+                          indicator_style, thin_labels)
+from ffa_analytics import ForecastParams, RATIO_TYPE, compute_forecast
+from figure_cache import figure_to_png
+from indicators import IndicatorStore
+from plotly_renderer import render_plotly
+from profiling import NULL_PROFILER
+
+# Строк (дат архива) на одной странице таблицы прогнозов
+TABLE_PAGE_ROWS = 200
+
+
+class FFAForecastPlotter:
+    def __init__(self, dataset, sma_windows=(), ewma_spans=(), std_windows=(), indicator_store=None,
+                 figure_cache=None, backend='matplotlib', profiler=NULL_PROFILER):
+        self.dataset = dataset
+        self.profiler = profiler
+        self.indicator_store = indicator_store if indicator_store is not None else IndicatorStore()
+        self.figure_cache = figure_cache
+        # 'matplotlib' - PNG как раньше, 'plotly' - интерактивный WebGL-график с прореживанием
+        self.backend = backend
+        self.sma_windows = list(sma_windows)
+        self.ewma_spans = list(ewma_spans)
+        self.std_windows = list(std_windows)
+        # Последний показанный ForecastResult (спреды и их сигналы для таблиц под графиком)
+        self.result = None
+
+    def _plot_indicators(self, ax1, result):
+        params = result.params
+        categories = dict.fromkeys(series.category for series in result.indicators)
+        for category in categories:
+            for position, window in enumerate(params.sma_windows):
+                sma = result.indicator(category, 'sma', window)
+
+                # Линия SMA
+                color = indicator_style(SMA_COLORS, window, position)
+                ax1.plot(sma.dates, sma.values, '--', color=color, alpha=0.6,
+                         label=f'{window}-day SMA ({category})')
+
+                # Площадь стандартного отклонения
+                std = result.indicator(category, 'std', window)
+                if std is not None:
+                    ax1.fill_between(sma.dates,
+                                     sma.values - std.values,
+                                     sma.values + std.values,
+                                     color=indicator_style(STD_COLORS, window, position),
+                                     alpha=0.2, label=f'{window}-day Rolling Std Area')
+
+            for position, span in enumerate(params.ewma_spans):
+                ewma = result.indicator(category, 'ewma', span)
+                color = indicator_style(EWMA_COLORS, span, position)
+                ax1.plot(ewma.dates, ewma.values, '-', color=color, alpha=0.6,
+                         label=f'{span}-day EWMA ({category})')
+
+    @staticmethod
+    def _ratio_bars(dates, ratio, width=0.8):
+        """Столбцы Ratio одной коллекцией: прямоугольники и цвета (зеленый > 1, красный) считаются в NumPy."""
+        x = mdates.date2num(np.asarray(dates, dtype='datetime64[ns]'))
+        valid = ~np.isnan(ratio)
+        x, height = x[valid], ratio[valid]
+        left, right = x - width / 2, x + width / 2
+        zeros = np.zeros_like(height)
+        verts = np.stack([np.column_stack([left, zeros]), np.column_stack([left, height]),
+                          np.column_stack([right, height]), np.column_stack([right, zeros])], axis=1)
+        colors = np.where(height > 1, 'g', 'r')
+        return PolyCollection(verts, facecolors=colors, edgecolors='none', alpha=0.3)
+
+    def _plot_historical_data(self, ax1, result, ratio_ax=None):
+        history = {series.category: series for series in result.history}
+
+        for data_type in result.params.historical_data_types:
+            if data_type == "Brent Oil":
+                series = history[data_type]
+                ax2 = ax1.twinx()
+                ax2.plot(series.dates, series.values, 'g-', label='Brent Oil')
+                ax2.set_ylabel("Brent Oil Price", color='g')
+                ax2.set_ylim(np.nanmin(series.values) * 0.9, np.nanmax(series.values) * 1.1)
+                ax1.plot([], [], 'g-', label='Brent Oil (Second Y-Axis)')
+
+            elif data_type == RATIO_TYPE:
+                merged_data = result.ratio
+                if merged_data is None:
+                    continue
+                # Вместе с Brent отношение рисуется на своей панели, иначе - на второй оси Y
+                ax2 = ratio_ax if ratio_ax is not None else ax1.twinx()
+                ratio = merged_data['Ratio'].to_numpy(dtype=float)
+                ax2.add_collection(self._ratio_bars(merged_data['ArchiveDate'], ratio))
+                ax2.autoscale_view()
+
+                signals = result.signals
+                for signal_type, color, marker, offset, va, label in (
+                        ('L', 'blue', '^', 0.05, 'bottom', 'Low Signal (пробой вниз)'),
+                        ('S', 'purple', 'v', -0.05, 'top', 'High Signal (пробой вверх)')):
+                    typed = signals[signals['Type'] == signal_type]
+                    if typed.empty:
+                        continue
+                    ax2.scatter(typed['ArchiveDate'], typed['Ratio'], color=color, marker=marker, s=120,
+                                zorder=5, label=label)
+                    # Подписей не больше MAX_SIGNAL_LABELS, на длинном диапазоне - по одной на участок оси.
+                    # Отдельный Text на подпись: артиста для многих строк в matplotlib нет, а их число
+                    # ограничено прореживанием и от длины истории не зависит
+                    dates = typed['ArchiveDate'].to_numpy()
+                    values = typed['Ratio'].to_numpy(dtype=float)
+                    thresholds = typed['Threshold'].to_numpy()
+                    for position in thin_labels(dates):
+                        ax2.text(dates[position], values[position] + offset,
+                                 f"{signal_type}\n({thresholds[position]})",
+                                 ha='center', va=va, color=color, fontsize=10, fontweight='bold')
+
+                if ratio_ax is None:
+                    ax1.plot([], [], 'g-', label='C5TC / P5TC Ratio')
+                ax2.set_ylabel("C5TC / P5TC Ratio", color='g')
+                # Первая точка без Ratio_prev в пределы оси не входит
+                ratio_prev = merged_data['Ratio_prev'].to_numpy(dtype=float)
+                ratio_values = ratio[~np.isnan(ratio) & ~np.isnan(ratio_prev)]
+                if len(ratio_values):
+                    ax2.set_ylim(ratio_values.min() * 0.85, ratio_values.max() * 1.15)
+            else:
+                series = history[data_type]
+                ax1.plot(series.dates, series.values, label=f'Actual ({data_type})')
+
+    @staticmethod
+    def _plot_spreads(axes, spreads):
+        for ax, spread in zip(axes, spreads):
+            frame, spec = spread.frame, spread.spec
+            ax.plot(frame['ArchiveDate'], frame['Ratio'], color='teal', linewidth=1.2, label=spec.name)
+            for thresholds, color in ((spec.low_thresholds, 'blue'), (spec.high_thresholds, 'purple')):
+                for threshold in thresholds:
+                    ax.axhline(threshold, color=color, linestyle=':', linewidth=0.8)
+            for signal_type, color, marker in (('L', 'blue', '^'), ('S', 'purple', 'v')):
+                typed = spread.signals[spread.signals['Type'] == signal_type]
+                if typed.empty:
+                    continue
+                ax.scatter(typed['ArchiveDate'], typed['Ratio'], color=color, marker=marker, s=60, zorder=5)
+                dates = typed['ArchiveDate'].to_numpy()
+                values = typed['Ratio'].to_numpy(dtype=float)
+                thresholds = typed['Threshold'].to_numpy()
+                for position in thin_labels(dates):
+                    ax.annotate(f"{signal_type} ({thresholds[position]})", (dates[position], values[position]),
+                                textcoords='offset points', xytext=(0, 8 if signal_type == 'L' else -14),
+                                ha='center', color=color, fontsize=8, fontweight='bold')
+            ax.set_ylabel(spec.name, fontsize=10)
+            ax.grid(True, linestyle='--', linewidth=0.5, alpha=0.8)
+
+    def _plot_forecasts(self, ax1, result):
+        colors = category_colors(result.params.forecast_types)
+
+        for curve in result.forecasts:
+            if curve.averaged:
+                ax1.plot(curve.start_dates, curve.values, '--',
+                         color=colors[curve.category],
+                         label=curve.label,
+                         linewidth=2)
+            else:
+                ax1.plot(curve.start_dates, curve.values, 'o-',
+                         color=colors[curve.category],
+                         label=curve.label,
+                         alpha=0.8)
+
+    def _finalize_plot(self, ax1, show_legend=True):
+        if show_legend:
+            ax1.legend(loc='upper right')
+        ax1.set_title("FFA Forecast vs Actual", fontsize=16, color='darkblue')
+        ax1.set_xlabel("Дата", fontsize=12, fontweight='light')
+        ax1.set_ylabel("Route Average", fontsize=12, fontweight='light')
+        ax1.grid(True, which='both', linestyle='--', linewidth=0.5, alpha=0.8)
+        ax1.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
+        ax1.xaxis.set_major_locator(mdates.MonthLocator(interval=2))
+        plt.xticks(rotation=45)
+
+    @staticmethod
+    def _render_tables(pivot_tables, page_rows=TABLE_PAGE_ROWS):
+        for category, df_pivoted in pivot_tables.items():
+            st.subheader(category)
+            pages = -(-len(df_pivoted) // page_rows)
+            if pages > 1:
+                # В браузер отправляется только выбранная страница, а не вся таблица за много месяцев
+                page = st.number_input(f"Страница (по {page_rows} дат, всего {pages})", min_value=1,
+                                       max_value=pages, value=1, step=1, key=f"table_page_{category}")
+                df_pivoted = df_pivoted.iloc[(page - 1) * page_rows:page * page_rows]
+            st.dataframe(df_pivoted, width=1000)
+
+    def params(self, historical_data_types, forecast_types, dates, start_date, end_date, average_forcast_mode,
+               average_forcast_mode_group, low_thresholds, high_thresholds, spreads=()):
+        return ForecastParams.create(historical_data_types, forecast_types, dates, start_date, end_date,
+                                     average_forcast_mode, average_forcast_mode_group,
+                                     low_thresholds, high_thresholds,
+                                     sma_windows=self.sma_windows,
+                                     ewma_spans=self.ewma_spans,
+                                     std_windows=self.std_windows,
+                                     spreads=spreads)
+
+    def compute(self, *args, **kwargs):
+        """Расчет без отрисовки, аргументы как у plot_forecast."""
+        return compute_forecast(self.dataset, self.params(*args, **kwargs), self.indicator_store, self.profiler)
+
+    def render(self, result):
+        """Рисует рассчитанный ForecastResult на новой фигуре и возвращает ее."""
+        params = result.params
+        ratio_panel = (result.ratio is not None and RATIO_TYPE in params.historical_data_types
+                       and "Brent Oil" in params.historical_data_types)
+        n_panels = int(ratio_panel) + len(result.spreads)
+        if n_panels:
+            # Спреды - панели под основным графиком с общей осью дат
+            fig, axes = plt.subplots(1 + n_panels, 1, sharex=True, figsize=(16, 8 + 3 * n_panels),
+                                     gridspec_kw={'height_ratios': [8] + [3] * n_panels})
+            ax1, panels = axes[0], list(axes[1:])
+        else:
+            fig, ax1 = plt.subplots(figsize=(16, 8))
+            panels = []
+        fig.autofmt_xdate()
+
+        self._plot_historical_data(ax1, result, ratio_ax=panels[0] if ratio_panel else None)
+        self._plot_spreads(panels[1:] if ratio_panel else panels, result.spreads)
+        self._plot_forecasts(ax1, result)
+        self._plot_indicators(ax1, result)
+        self._finalize_plot(ax1, show_legend=len(params.dates) <= 9 or params.average_forcast_mode)
+        if panels:
+            ax1.set_xlabel("")
+            panels[-1].set_xlabel("Дата", fontsize=12, fontweight='light')
+        return fig
+
+    def plot_forecast(self, historical_data_types, forecast_types, dates, start_date, end_date, average_forcast_mode,
+                      average_forcast_mode_group, low_thresholds, high_thresholds, spreads=()):
+        result = self.compute(historical_data_types, forecast_types, dates, start_date, end_date,
+                              average_forcast_mode, average_forcast_mode_group, low_thresholds, high_thresholds,
+                              spreads)
+        return self.show(result)
+
+    def show(self, result):
+        """Выводит в Streamlit график и таблицы готового ForecastResult, возвращает его сигналы."""
+        self.result = result
+        if self.backend == 'plotly':
+            with self.profiler.stage('render_plotly'):
+                fig = render_plotly(result)
+            with self.profiler.stage('display'):
+                st.plotly_chart(fig, use_container_width=True)
+        elif self.figure_cache is None:
+            with self.profiler.stage('render'):
+                self.render(result)
+            with self.profiler.stage('display'):
+                st.pyplot(plt, clear_figure=True)
+        else:
+            # Повторный просмотр с теми же параметрами - готовый PNG без отрисовки matplotlib
+            key = self.figure_cache.key(self.dataset, result.params)
+            png = self.figure_cache.get(key)
+            cache_hit = png is not None
+            if not cache_hit:
+                with self.profiler.stage('render'):
+                    fig = self.render(result)
+                with self.profiler.stage('encode_png'):
+                    png = figure_to_png(fig)
+                    plt.close(fig)
+                self.figure_cache.put(key, png)
+            with self.profiler.stage('display', figure_cache_hit=cache_hit):
+                st.image(png, use_container_width=True)
+        with self.profiler.stage('tables'):
+            self._render_tables(result.pivot_tables)
+        return result.signals
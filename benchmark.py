@@ -0,0 +1,172 @@
+"""
+Бенчмарк этапов расчета на синтетических данных.
+
+    python benchmark.py --years 1 5 20 --output bench.json
+    python benchmark.py --years 5 --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+import data_cache
+from bdi_plot_maker import FFAForecastPlotter
+from ffa_analytics import ForecastParams, _average_curves, compute_forecast, forecast_pivot_tables
+from ffa_dataset import FFADataset
+from figure_cache import figure_to_png
+from indicators import IndicatorStore
+from signals import ratio_signals
+from synthetic_data import make_frame, write_workbook
+
+STAGES = ['ingest', 'indexing', 'indicators', 'signals', 'averaging', 'pivot', 'render']
+
+HISTORY_TYPES = ['C5TC FACT', 'P5TC FACT', 'C5TC / P5TC']
+FORECAST_TYPES = ['Monthly Contract (MON)', 'Quarterly Contract (Q)', 'Calendar Year Contract (CAL)']
+
+
+def _time(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _params(dataset, months=1):
+    # "Месяц целиком" за последние months месяцев, вся история в диапазоне графика
+    dates = dataset.group_dates('BFA Cape')
+    last_month = dates[-1].astype('datetime64[M]')
+    selected = dates[dates >= last_month - np.timedelta64(months - 1, 'M')]
+    return ForecastParams.create(HISTORY_TYPES, FORECAST_TYPES, selected, dates[0], dates[-1],
+                                 average_forcast_mode=True, average_forcast_mode_group="Месяца до кварталов",
+                                 low_thresholds=[0.75, 0.5], high_thresholds=[1.75, 2.0],
+                                 sma_windows=[20, 50, 90, 200], ewma_spans=[10, 30, 90], std_windows=[90, 200])
+
+
+def run_scale(years, repeat, stages, workdir):
+    df = make_frame(years)
+    results = {}
+
+    def record(stage, timings):
+        results[stage] = {'min_s': min(timings), 'median_s': statistics.median(timings), 'runs': len(timings)}
+        print(f"  {stage:<12} min {min(timings) * 1000:9.1f} ms   median {statistics.median(timings) * 1000:9.1f} ms")
+
+    if 'ingest' in stages:
+        path = write_workbook(df, os.path.join(workdir, f'bfa_{years}y.xlsx'))
+        with open(path, 'rb') as file:
+            data = file.read()
+        data_cache.CACHE_DIR = os.path.join(workdir, 'cache')
+        # Холодная загрузка (разбор Excel) - один раз, иначе считаем уже теплый кэш
+        record('ingest', _time(lambda: data_cache.load_workbook(data), 1))
+        record('ingest_warm', _time(lambda: data_cache.load_workbook(data), repeat))
+
+    if 'indexing' in stages:
+        record('indexing', _time(lambda: FFADataset(df), repeat))
+    dataset = FFADataset(df)
+    params = _params(dataset)
+
+    if 'indicators' in stages:
+        def indicators():
+            store = IndicatorStore()
+            for indicator, windows in (('sma', params.sma_windows), ('ewma', params.ewma_spans)):
+                store.get(dataset, 'C5TC FACT', indicator, windows)
+        record('indicators', _time(indicators, repeat))
+
+    if 'signals' in stages:
+        c5tc, p5tc = dataset.category('C5TC FACT'), dataset.category('P5TC FACT')
+        record('signals', _time(lambda: ratio_signals(c5tc, p5tc, params.low_thresholds, params.high_thresholds),
+                                repeat))
+
+    result = compute_forecast(dataset, params)
+    if 'averaging' in stages:
+        # Усреднение за весь последний год дат архива
+        year_params = _params(dataset, months=12)
+        points = compute_forecast(dataset, year_params).forecast_points
+        record('averaging', _time(lambda: _average_curves(points.copy(), year_params), repeat))
+
+    if 'pivot' in stages:
+        record('pivot', _time(lambda: forecast_pivot_tables(result.forecast_points), repeat))
+
+    if 'render' in stages:
+        plotter = FFAForecastPlotter(dataset, params.sma_windows, params.ewma_spans, params.std_windows)
+
+        def render():
+            fig = plotter.render(result)
+            figure_to_png(fig)
+            plt.close(fig)
+        record('render', _time(render, repeat))
+
+    return {'years': years, 'rows': len(df), 'stages': results}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, encoding='utf-8') as file:
+        baseline = json.load(file)
+    previous = {(run['years'], stage): values['min_s']
+                for run in baseline['runs'] for stage, values in run['stages'].items()}
+    print(f"\nСравнение с {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    for run in current['runs']:
+        for stage, values in run['stages'].items():
+            old = previous.get((run['years'], stage))
+            if old:
+                print(f"  {run['years']:>3}y {stage:<12} {old * 1000:9.1f} -> {values['min_s'] * 1000:9.1f} ms"
+                      f"   x{old / values['min_s']:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк этапов расчета FFA на синтетических данных")
+    parser.add_argument('--years', type=float, nargs='+', default=[1, 5, 20], help="Масштабы истории в годах")
+    parser.add_argument('--repeat', type=int, default=5, help="Повторов на этап (берется минимум и медиана)")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--output', help="Куда записать результаты в JSON")
+    parser.add_argument('--compare', help="JSON прошлого запуска для сравнения")
+    args = parser.parse_args(argv)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'repeat': args.repeat,
+        },
+        'runs': [],
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for years in args.years:
+            print(f"{years:g} лет истории:")
+            report['runs'].append(run_scale(years, args.repeat, args.stages, workdir))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
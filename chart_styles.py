@@ -0,0 +1,53 @@
+import numpy as np
+
+# Цвета исторически привычных окон, остальные берутся по кругу из EXTRA_INDICATOR_COLORS
+SMA_COLORS = {90: 'g', 200: 'b'}
+STD_COLORS = {90: 'yellow', 200: 'black'}
+EWMA_COLORS = {30: 'r', 90: 'm'}
+EXTRA_INDICATOR_COLORS = ['orange', 'purple', 'brown', 'olive', 'teal', 'navy', 'crimson']
+
+# Больше подписей сигналов на графике не читается: они прореживаются по плотности
+MAX_SIGNAL_LABELS = 60
+
+# Однобуквенные цвета matplotlib в именах, понятных plotly
+_SHORT_COLORS = {'g': 'green', 'b': 'blue', 'r': 'red', 'm': 'magenta', 'k': 'black', 'y': 'yellow', 'c': 'cyan'}
+
+
+def indicator_style(styles, window, position):
+    if window in styles:
+        return styles[window]
+    return EXTRA_INDICATOR_COLORS[position % len(EXTRA_INDICATOR_COLORS)]
+
+
+def category_colors(forecast_types):
+    colors = {
+        'Monthly Contract (MON)': 'blue',
+        'Quarterly Contract (Q)': 'green',
+        'Calendar Year Contract (CAL)': 'red'
+    }
+
+    extra_colors = ['orange', 'purple', 'brown', 'pink', 'cyan', 'magenta']
+    for i, cat in enumerate(forecast_types):
+        if cat not in colors:
+            colors[cat] = extra_colors[i % len(extra_colors)]
+    return colors
+
+
+def full_color_name(color):
+    return _SHORT_COLORS.get(color, color)
+
+
+def thin_labels(dates, max_labels=MAX_SIGNAL_LABELS):
+    """
+    Позиции подписей, которые стоит рисовать: все, если их не больше max_labels,
+    иначе по одной (первой) на каждую из max_labels равных частей диапазона дат.
+    """
+    x = np.asarray(dates, dtype='datetime64[ns]').astype(np.int64)
+    if len(x) <= max_labels:
+        return np.arange(len(x))
+    span = x.max() - x.min()
+    if span == 0:
+        return np.arange(max_labels)
+    bins = np.minimum((x - x.min()) / span * max_labels, max_labels - 1).astype(np.int64)
+    _, first = np.unique(bins, return_index=True)
+    return np.sort(first)
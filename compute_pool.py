@@ -0,0 +1,120 @@
+import os
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, TimeoutError
+
+from cachetools import LRUCache
+
+# Потоков для фоновых расчетов на процесс
+WORKERS = int(os.environ.get('BDI_COMPUTE_WORKERS', 2))
+# Сколько готовых результатов держать (повторный выбор тех же параметров - без расчета)
+RESULTS_CACHE_SIZE = int(os.environ.get('BDI_COMPUTE_RESULTS', 32))
+
+
+class _Job:
+    def __init__(self, key):
+        self.key = key
+        self.sessions = set()
+        self.cancel = threading.Event()
+        self.future = None
+
+
+class ComputePool:
+    """
+    Пул фоновых расчетов по ключу параметров (версия датасета, ForecastParams).
+    Одинаковые ключи из разных сессий делят одну задачу. Новая задача сессии снимает ее прошлую:
+    ожидающая в очереди отменяется, уже идущая получает cancel-событие и прерывается на границе этапов.
+    Для каждой сессии хранится последний готовый результат, чтобы показывать его, пока идет пересчет.
+    """
+
+    def __init__(self, workers=WORKERS, results_cache_size=RESULTS_CACHE_SIZE):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bdi-compute')
+        self._results = LRUCache(maxsize=results_cache_size)
+        self._jobs = {}
+        self._session_jobs = {}
+        self._last_good = LRUCache(maxsize=256)
+        # Ключ только что посчитанной задачи -> сессии, ждавшие ее (см. fresh)
+        self._fresh = LRUCache(maxsize=256)
+        self._lock = threading.Lock()
+
+    def submit(self, session, key, fn):
+        """
+        Future с результатом fn(cancel_event) для ключа. Готовый результат берется из кэша,
+        идущая задача с тем же ключом переиспользуется.
+        """
+        with self._lock:
+            if key in self._results:
+                future = Future()
+                future.set_result(self._results[key])
+                self._replace(session, None)
+                return future
+            job = self._jobs.get(key)
+            if job is None:
+                job = self._jobs[key] = _Job(key)
+                job.future = self._executor.submit(self._run, job, fn)
+            self._replace(session, job)
+            return job.future
+
+    def _replace(self, session, job):
+        previous = self._session_jobs.pop(session, None)
+        if previous is not None and previous is not job:
+            previous.sessions.discard(session)
+            if not previous.sessions:
+                # Результат больше никому не нужен
+                previous.cancel.set()
+                previous.future.cancel()
+                if self._jobs.get(previous.key) is previous:
+                    del self._jobs[previous.key]
+        if job is not None:
+            job.sessions.add(session)
+            self._session_jobs[session] = job
+
+    def _run(self, job, fn):
+        if job.cancel.is_set():
+            raise CancelledError()
+        try:
+            result = fn(job.cancel)
+            with self._lock:
+                self._results[job.key] = result
+                self._fresh[job.key] = set(job.sessions)
+            return result
+        finally:
+            with self._lock:
+                if self._jobs.get(job.key) is job:
+                    del self._jobs[job.key]
+                for session in job.sessions:
+                    if self._session_jobs.get(session) is job:
+                        del self._session_jobs[session]
+
+    def wait(self, session, key, future, timeout):
+        """Результат future или None, если он не готов за timeout; CancelledError, если задачу сняли."""
+        try:
+            result = future.result(timeout)
+        except TimeoutError:
+            return None
+        with self._lock:
+            self._last_good[session] = (key, result)
+        return result
+
+    def fresh(self, session, key):
+        """
+        True один раз на задачу: для первой из ждавших ее сессий, получившей результат.
+        Повторная выдача того же результата из кэша дает False - например, чтобы не учитывать
+        замеры этапов расчета, который в этом прогоне не выполнялся.
+        """
+        with self._lock:
+            if session in self._fresh.get(key, ()):
+                del self._fresh[key]
+                return True
+            return False
+
+    def last_good(self, session, dataset_key):
+        """Последний готовый результат сессии для той же версии датасета или None."""
+        with self._lock:
+            key, result = self._last_good.get(session, (None, None))
+        if key is None or key[0] != dataset_key:
+            return None
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {'running': len(self._jobs), 'cached_results': len(self._results)}
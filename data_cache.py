@@ -0,0 +1,144 @@
+import hashlib
+import io
+import os
+import uuid
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pyarrow.feather as feather
+
+# Каталог для сконвертированных книг, можно переопределить через переменную окружения
+CACHE_DIR = os.environ.get(
+    'BDI_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.bdi_cache')
+)
+DATE_COLUMNS = ['ArchiveDate', 'StartDate']
+NUMERIC_COLUMNS = ['RouteAverage']
+# Колонки выгрузки, которые использует приложение; остальные при чтении пропускаются
+WORKBOOK_COLUMNS = ['Category', 'GroupDesc', 'ArchiveDate', 'StartDate', 'Index_Label', 'RouteAverage']
+# Строк листа в одном блоке при потоковом чтении
+CHUNK_ROWS = 2000
+# Версия формата кэша: меняется вместе с тем, что пишется в Arrow-файл (колонки, типы),
+# чтобы файлы, записанные прежним кодом, не читались как есть. 2 - потоковое чтение с категориями
+CACHE_VERSION = 2
+
+
+def content_hash(data):
+    """Хэш содержимого загруженного файла (ключ кэша)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_path(key):
+    return os.path.join(CACHE_DIR, f'{key}.v{CACHE_VERSION}.arrow')
+
+
+def _date_chunk(values):
+    return pd.to_datetime(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype='datetime64[ns]')
+
+
+def _numeric_chunk(values):
+    return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=float)
+
+
+def _string_chunk(values, lookup):
+    """Коды строк в общем словаре колонки; числа из Excel приводятся к строкам, пустые ячейки - код -1."""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    if not len(uniques):
+        return codes.astype(np.int32)
+    remap = np.array([lookup.setdefault(value if isinstance(value, str) else str(value), len(lookup))
+                      for value in uniques], dtype=np.int32)
+    return np.where(codes >= 0, remap[codes], -1).astype(np.int32)
+
+
+def read_workbook(source, columns=WORKBOOK_COLUMNS, progress=None):
+    """
+    Читает первый лист xlsx в DataFrame: только колонки columns, строки потоком (openpyxl read_only)
+    блоками по CHUNK_ROWS. Каждый блок сразу переводится в типизированные массивы (даты разбираются
+    один раз, строки - коды категорий), поэтому в памяти не держатся все ячейки листа.
+    progress(доля) вызывается после каждого блока.
+    """
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, ())
+        positions = {name: position for position, name in enumerate(header) if name in columns}
+        names = [name for name in columns if name in positions]
+        total_rows = max((sheet.max_row or 0) - 1, 1)
+
+        chunks = {name: [] for name in names}
+        lookups = {name: {} for name in names if name not in DATE_COLUMNS + NUMERIC_COLUMNS}
+        getters = [positions[name] for name in names]
+        read_rows = 0
+
+        def flush(block):
+            for name, values in zip(names, zip(*block)):
+                if name in DATE_COLUMNS:
+                    chunks[name].append(_date_chunk(values))
+                elif name in NUMERIC_COLUMNS:
+                    chunks[name].append(_numeric_chunk(values))
+                else:
+                    chunks[name].append(_string_chunk(values, lookups[name]))
+
+        block = []
+        for row in rows:
+            values = tuple(row[position] if position < len(row) else None for position in getters)
+            # Пустые строки листа (как пропускает pd.read_excel)
+            if all(value is None for value in values):
+                continue
+            block.append(values)
+            if len(block) == CHUNK_ROWS:
+                flush(block)
+                read_rows += len(block)
+                block = []
+                if progress is not None:
+                    progress(min(read_rows / total_rows, 1.0))
+        if block:
+            flush(block)
+    finally:
+        workbook.close()
+    if progress is not None:
+        progress(1.0)
+
+    data = {}
+    for name in names:
+        if name in lookups:
+            codes = np.concatenate(chunks[name]) if chunks[name] else np.empty(0, dtype=np.int32)
+            data[name] = pd.Categorical.from_codes(codes, categories=list(lookups[name]))
+        elif name in DATE_COLUMNS:
+            data[name] = np.concatenate(chunks[name]) if chunks[name] else np.empty(0, dtype='datetime64[ns]')
+        else:
+            data[name] = np.concatenate(chunks[name]) if chunks[name] else np.empty(0)
+    return pd.DataFrame(data, columns=names)
+
+
+def _write_cache(df, path):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Сессии Streamlit - потоки одного процесса: имя временного файла уникально на каждую запись
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    # Без сжатия, чтобы файл можно было читать через memory map без распаковки
+    feather.write_feather(df, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+
+def read_cached(key):
+    """Читает сконвертированную книгу через memory map, None если её нет в кэше."""
+    path = cache_path(key)
+    if not os.path.exists(path):
+        return None
+    return feather.read_table(path, memory_map=True)
+
+
+def load_workbook(data, progress=None):
+    """
+    Возвращает (ключ, DataFrame) для байтов xlsx-файла.
+    Excel парсится только один раз на содержимое, дальше читается Arrow-файл.
+    progress получает долю прочитанных строк, только если файл читается из Excel.
+    """
+    key = content_hash(data)
+    table = read_cached(key)
+    if table is None:
+        _write_cache(read_workbook(io.BytesIO(data), progress=progress), cache_path(key))
+        table = read_cached(key)
+    return key, table.to_pandas()
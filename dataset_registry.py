@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+
+import pandas as pd
+
+# Сколько секунд датасет без сессий остается в памяти (вдруг файл откроют снова)
+IDLE_SECONDS = float(os.environ.get('BDI_DATASET_IDLE_SECONDS', 1800))
+# Сколько датасетов без сессий держать максимум, лишние вытесняются начиная с самых старых
+MAX_IDLE_DATASETS = int(os.environ.get('BDI_MAX_IDLE_DATASETS', 2))
+# Сессия без прогонов дольше этого считается закрытой (Streamlit не сообщает о закрытии вкладки)
+SESSION_TIMEOUT = float(os.environ.get('BDI_SESSION_TIMEOUT', 3600))
+
+
+class _Entry:
+    def __init__(self):
+        self.dataset = None
+        self.sessions = {}
+        self.released_at = None
+        self.pending = 0
+        self.lock = threading.Lock()
+
+
+class DatasetRegistry:
+    """
+    Общий на процесс реестр FFADataset по ключу (хэш содержимого файла).
+    Все сессии с одним файлом получают один и тот же объект только для чтения,
+    ссылки считаются по сессиям, датасеты без сессий вытесняются по времени и количеству.
+    """
+
+    def __init__(self, idle_seconds=IDLE_SECONDS, max_idle=MAX_IDLE_DATASETS, session_timeout=SESSION_TIMEOUT,
+                 clock=time.monotonic):
+        self.idle_seconds = idle_seconds
+        self.max_idle = max_idle
+        self.session_timeout = session_timeout
+        self._clock = clock
+        self._entries = {}
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, session, key, loader):
+        """
+        Датасет по ключу для сессии; loader() вызывается только если его нет в памяти
+        (одновременные запросы одного ключа ждут одну загрузку). Прошлый датасет сессии освобождается.
+        """
+        with self._lock:
+            self._evict()
+            entry = self._entries.setdefault(key, _Entry())
+            entry.pending += 1
+        try:
+            with entry.lock:
+                if entry.dataset is None:
+                    entry.dataset = loader()
+        finally:
+            with self._lock:
+                entry.pending -= 1
+
+        with self._lock:
+            previous = self._sessions.get(session)
+            if previous is not None and previous != key:
+                self._release(session, previous)
+            self._sessions[session] = key
+            entry.sessions[session] = self._clock()
+            entry.released_at = None
+            # Запись могли вытеснить, пока шла загрузка - возвращаем ее в реестр
+            self._entries.setdefault(key, entry)
+            return entry.dataset
+
+    def release(self, session):
+        """Сессия больше не использует свой датасет (например, переключилась на архив)."""
+        with self._lock:
+            key = self._sessions.pop(session, None)
+            if key is not None:
+                self._release(session, key)
+            self._evict()
+
+    def _release(self, session, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry.sessions.pop(session, None)
+        if not entry.sessions:
+            entry.released_at = self._clock()
+
+    def _evict(self):
+        now = self._clock()
+        for key, entry in self._entries.items():
+            for session, last_seen in list(entry.sessions.items()):
+                if now - last_seen > self.session_timeout:
+                    del entry.sessions[session]
+                    if self._sessions.get(session) == key:
+                        del self._sessions[session]
+                    if not entry.sessions:
+                        entry.released_at = last_seen + self.session_timeout
+
+        idle = sorted(((entry.released_at or 0.0, key) for key, entry in self._entries.items()
+                       if not entry.sessions and not entry.pending))
+        for position, (released_at, key) in enumerate(idle):
+            if now - released_at > self.idle_seconds or position < len(idle) - self.max_idle:
+                del self._entries[key]
+
+    def evict_idle(self):
+        with self._lock:
+            self._evict()
+
+    def stats(self):
+        """Таблица датасетов в памяти: ключ, сессии, строки, размер, сколько простаивает."""
+        now = self._clock()
+        with self._lock:
+            rows = [{
+                'key': key[:12],
+                'sessions': len(entry.sessions),
+                'rows': len(entry.dataset.df) if entry.dataset is not None else 0,
+                'MB': round(entry.dataset.df.memory_usage(deep=True).sum() / 2 ** 20, 2)
+                if entry.dataset is not None else 0.0,
+                'idle_s': round(now - entry.released_at) if entry.released_at is not None else 0,
+            } for key, entry in self._entries.items()]
+        return pd.DataFrame(rows, columns=['key', 'sessions', 'rows', 'MB', 'idle_s'])
@@ -0,0 +1,291 @@
+from concurrent.futures import CancelledError
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from indicators import IndicatorStore
+from profiling import NULL_PROFILER
+from signals import SIGNAL_COLUMNS
+from spreads import SpreadSpec, compute_spreads
+
+RATIO_TYPE = 'C5TC / P5TC'
+FORECAST_COLUMNS = ['Category', 'ArchiveDate', 'RouteAverage', 'Index_Label', 'StartDate']
+
+
+@dataclass(frozen=True)
+class ForecastParams:
+    """Полный набор параметров одного расчета, хэшируемый (годится как ключ кэша)."""
+    historical_data_types: tuple
+    forecast_types: tuple
+    dates: tuple
+    start_date: pd.Timestamp
+    end_date: pd.Timestamp
+    average_forcast_mode: bool = False
+    average_forcast_mode_group: object = False
+    low_thresholds: tuple = ()
+    high_thresholds: tuple = ()
+    sma_windows: tuple = ()
+    ewma_spans: tuple = ()
+    std_windows: tuple = ()
+    # Пользовательские спреды (SpreadSpec) со своими порогами, рисуются отдельными панелями
+    spreads: tuple = ()
+
+    @classmethod
+    def create(cls, historical_data_types, forecast_types, dates, start_date, end_date,
+               average_forcast_mode=False, average_forcast_mode_group=False,
+               low_thresholds=None, high_thresholds=None,
+               sma_windows=(), ewma_spans=(), std_windows=(), spreads=()):
+        return cls(
+            historical_data_types=tuple(historical_data_types),
+            forecast_types=tuple(forecast_types),
+            dates=tuple(pd.Timestamp(date) for date in dates),
+            start_date=pd.Timestamp(start_date),
+            end_date=pd.Timestamp(end_date),
+            average_forcast_mode=bool(average_forcast_mode),
+            average_forcast_mode_group=average_forcast_mode_group,
+            low_thresholds=tuple(float(x) for x in (low_thresholds or [])),
+            high_thresholds=tuple(float(x) for x in (high_thresholds or [])),
+            sma_windows=tuple(int(x) for x in sma_windows),
+            ewma_spans=tuple(int(x) for x in ewma_spans),
+            std_windows=tuple(int(x) for x in std_windows),
+            spreads=tuple(spreads),
+        )
+
+
+@dataclass
+class HistorySeries:
+    category: str
+    dates: np.ndarray
+    values: np.ndarray
+
+
+@dataclass
+class ForecastCurve:
+    """Кривая прогноза: сырая (одна дата архива) или усредненная по группе дат."""
+    category: str
+    label: str
+    start_dates: np.ndarray
+    values: np.ndarray
+    archive_date: pd.Timestamp = None
+
+    @property
+    def averaged(self):
+        return self.archive_date is None
+
+
+@dataclass
+class IndicatorSeries:
+    category: str
+    indicator: str
+    window: int
+    dates: np.ndarray
+    values: np.ndarray
+
+
+@dataclass
+class ForecastResult:
+    params: ForecastParams
+    history: list = field(default_factory=list)
+    ratio: pd.DataFrame = None
+    signals: pd.DataFrame = field(default_factory=lambda: pd.DataFrame(columns=SIGNAL_COLUMNS))
+    forecasts: list = field(default_factory=list)
+    indicators: list = field(default_factory=list)
+    forecast_points: pd.DataFrame = None
+    pivot_tables: dict = field(default_factory=dict)
+    spreads: list = field(default_factory=list)
+
+    def indicator(self, category, indicator, window):
+        for series in self.indicators:
+            if (series.category, series.indicator, series.window) == (category, indicator, window):
+                return series
+        return None
+
+
+def _history(dataset, params, result):
+    for data_type in params.historical_data_types:
+        if data_type == RATIO_TYPE:
+            continue
+        category_data = dataset.category_range(data_type, params.start_date, params.end_date)
+        result.history.append(HistorySeries(data_type,
+                                            category_data['ArchiveDate'].to_numpy(),
+                                            category_data['RouteAverage'].to_numpy(dtype=float)))
+
+    # C5TC / P5TC и пользовательские спреды считаются по одной матрице цен
+    specs = list(params.spreads)
+    ratio_spec = None
+    if (RATIO_TYPE in params.historical_data_types and 'C5TC FACT' in params.historical_data_types
+            and 'P5TC FACT' in params.historical_data_types):
+        ratio_spec = SpreadSpec.create('C5TC FACT', 'P5TC FACT', 'ratio', params.low_thresholds,
+                                       params.high_thresholds, name=RATIO_TYPE)
+        specs.append(ratio_spec)
+    if not specs:
+        return
+    spreads = compute_spreads(dataset, specs, params.start_date, params.end_date)
+    if ratio_spec is not None:
+        ratio = spreads.pop()
+        if not ratio.frame.empty:
+            result.ratio, result.signals = ratio.frame, ratio.signals
+    result.spreads = spreads
+
+
+def _month_set_signature(cat_df):
+    """
+    Номер набора месяцев контрактов для каждой даты архива.
+    Даты с одинаковым набором (с учетом повторов) получают один номер:
+    строки матрицы "дата архива x месяц" с количеством контрактов сравниваются целиком.
+    """
+    date_codes, archive_dates = pd.factorize(cat_df['ArchiveDate'], sort=True)
+    month_codes, months = pd.factorize(cat_df['MonthYear'], sort=True)
+    counts = np.bincount(date_codes * len(months) + month_codes, minlength=len(archive_dates) * len(months))
+    _, inverse = np.unique(counts.reshape(len(archive_dates), len(months)), axis=0, return_inverse=True)
+    return pd.Series(inverse.ravel(), index=archive_dates)
+
+
+def _average_by_signature(cat_df, signature, min_archive_dates=1):
+    """
+    Средние кривые по группам дат архива с одинаковой сигнатурой (Series ArchiveDate -> ключ).
+    Одна группировка (сигнатура, StartDate) на все кривые сразу.
+    Возвращает ключи в порядке первой даты архива, средние с индексом (Signature, StartDate)
+    и первый месяц контрактов каждой группы.
+    """
+    dates_per_signature = signature.groupby(signature, sort=False).size()
+    keys = dates_per_signature.index[dates_per_signature >= min_archive_dates]
+    frame = cat_df.assign(Signature=cat_df['ArchiveDate'].map(signature).to_numpy())
+    grouped = frame.groupby(['Signature', 'StartDate'])
+    averaged = grouped['RouteAverage'].mean()
+    first_months = frame.groupby('Signature')['MonthYear'].min()
+    return keys, averaged, first_months
+
+
+def _average_curves(combined_df, params):
+    curves = []
+    combined_df['MonthYear'] = combined_df['StartDate'].to_numpy(dtype='datetime64[M]')
+    combined_df['QuarterStart'] = combined_df['StartDate'].dt.to_period('Q').dt.start_time
+
+    def curve(category, label, averaged, key):
+        avg = averaged.xs(key, level='Signature')
+        return ForecastCurve(category, label, avg.index.to_numpy(), avg.to_numpy(dtype=float))
+
+    for category in params.forecast_types:
+        cat_df = combined_df[combined_df['Category'] == category]
+        if cat_df.empty:
+            continue
+        if params.average_forcast_mode_group == "Месяца до кварталов" and category == 'Monthly Contract (MON)':
+            # Даты архива группируются по первому кварталу, в который попадают их контракты
+            quarters = cat_df.groupby('ArchiveDate')['QuarterStart'].min()
+            keys, averaged, _ = _average_by_signature(cat_df, quarters)
+            for quarter_dt in keys:
+                quarter_num = (quarter_dt.month - 1) // 3 + 1
+                curves.append(curve(category, f"{category} - {quarter_dt.year}-Q{quarter_num}", averaged, quarter_dt))
+
+        elif params.average_forcast_mode_group == "Месяцам" or category != 'Monthly Contract (MON)':
+            # Даты архива с одинаковым набором месяцев; одиночные даты не усредняются
+            signatures = _month_set_signature(cat_df)
+            keys, averaged, first_months = _average_by_signature(cat_df, signatures, min_archive_dates=2)
+            for key in keys:
+                month_label = first_months[key].strftime('%Y-%m')
+                curves.append(curve(category, f"{category} - {month_label}", averaged, key))
+        else:
+            # Обычное усреднение по StartDate
+            avg = cat_df.groupby('StartDate')['RouteAverage'].mean()
+            curves.append(ForecastCurve(category, f"{category} (Average)",
+                                        avg.index.to_numpy(), avg.to_numpy(dtype=float)))
+    return curves
+
+
+def _forecasts(dataset, params, result):
+    subsets = []
+    # Все пары (категория, дата) одной выборкой: для SQL-датасета это один запрос вместо запроса на пару
+    points = dataset.categories_on(params.forecast_types, params.dates)
+    for date in params.dates:
+        for category in params.forecast_types:
+            subset = points[category, date][FORECAST_COLUMNS]
+            subsets.append(subset)
+            if not params.average_forcast_mode:
+                result.forecasts.append(ForecastCurve(category, f"{category} ({date.strftime('%Y-%m-%d')})",
+                                                      subset['StartDate'].to_numpy(),
+                                                      subset['RouteAverage'].to_numpy(dtype=float),
+                                                      archive_date=date))
+
+    if subsets:
+        result.forecast_points = pd.concat(subsets, ignore_index=True)
+    else:
+        result.forecast_points = pd.DataFrame(columns=FORECAST_COLUMNS)
+
+    if params.average_forcast_mode:
+        result.forecasts.extend(_average_curves(result.forecast_points.copy(), params))
+
+
+def _indicators(dataset, params, result, indicator_store, categories=('C5TC FACT',)):
+    # Std имеет смысл только как полоса вокруг SMA того же окна
+    std_windows = [window for window in params.sma_windows if window in params.std_windows]
+
+    for category in categories:
+        # Все окна категории считаются одним батчем и кэшируются, здесь берется только срез по датам
+        for indicator, windows in (('sma', params.sma_windows), ('std', std_windows), ('ewma', params.ewma_spans)):
+            dates, values = indicator_store.series(dataset, category, indicator, windows,
+                                                   params.start_date, params.end_date)
+            for window in windows:
+                result.indicators.append(IndicatorSeries(category, indicator, window, dates, values[window]))
+
+
+def forecast_pivot_tables(forecast_points):
+    """
+    Таблицы прогнозов по категориям: строки - даты архива, колонки - контракты по порядку StartDate.
+    Одна группировка (Category, ArchiveDate) x Index_Label на все категории; короткие имена
+    контрактов и порядок колонок считаются по уникальным значениям, а не по каждой строке.
+    """
+    tables = {}
+    if forecast_points is None or forecast_points.empty:
+        return tables
+
+    codes, labels = pd.factorize(forecast_points['Index_Label'])
+    short_labels = pd.Index(labels, dtype=object).str.split("_").str[1].to_numpy(dtype=object)
+    points = pd.DataFrame({
+        'Category': forecast_points['Category'].to_numpy(dtype=object),
+        'ArchiveDate': forecast_points['ArchiveDate'].to_numpy(),
+        'Index_Label': short_labels[codes],
+        'StartDate': forecast_points['StartDate'].to_numpy(),
+        'RouteAverage': forecast_points['RouteAverage'].to_numpy(),
+    })
+    grid = points.groupby(['Category', 'ArchiveDate', 'Index_Label'], sort=True)['RouteAverage'].mean()
+    grid = grid.unstack('Index_Label')
+
+    # Порядок колонок: первое появление контракта при сортировке по StartDate, внутри каждой категории
+    order = points.sort_values('StartDate', kind='stable').drop_duplicates(['Category', 'Index_Label'])
+    columns = order.groupby('Category', sort=False)['Index_Label'].agg(list)
+
+    for category in pd.unique(points['Category']):
+        table = grid.loc[category, columns[category]]
+        table.index = table.index.strftime('%Y-%m-%d').rename('ArchiveDate')
+        table.columns = pd.Index(table.columns, dtype=object, name='Index_Label')
+        tables[category] = table
+    return tables
+
+
+def _check_cancel(cancel):
+    if cancel is not None and cancel.is_set():
+        raise CancelledError()
+
+
+def compute_forecast(dataset, params, indicator_store=None, profiler=NULL_PROFILER, cancel=None):
+    """
+    Расчет без отрисовки: история, кривые прогнозов, индикаторы, сигналы и сводные таблицы.
+    Не зависит от matplotlib и Streamlit, поэтому годится для пакетных задач и бенчмарков.
+    cancel (threading.Event) проверяется между этапами: при отмене - CancelledError.
+    """
+    indicator_store = indicator_store if indicator_store is not None else IndicatorStore()
+    result = ForecastResult(params=params)
+    with profiler.stage('history_signals'):
+        _history(dataset, params, result)
+    _check_cancel(cancel)
+    with profiler.stage('forecasts_averaging', dates=len(params.dates)):
+        _forecasts(dataset, params, result)
+    _check_cancel(cancel)
+    with profiler.stage('indicators'):
+        _indicators(dataset, params, result, indicator_store)
+    _check_cancel(cancel)
+    with profiler.stage('pivot'):
+        result.pivot_tables = forecast_pivot_tables(result.forecast_points)
+    return result
@@ -0,0 +1,187 @@
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+
+# Строковые колонки с небольшим числом разных значений: хранятся как коды category
+STRING_COLUMNS = ['Category', 'GroupDesc', 'Index_Label']
+# Тип цен в памяти: float32 вдвое экономит память на RouteAverage ценой ~7 значащих цифр
+PRICE_DTYPE = os.environ.get('BDI_PRICE_DTYPE', 'float64')
+
+
+def compact_frame(df, price_dtype=PRICE_DTYPE):
+    """Копия таблицы со строковыми колонками в category и ценами в price_dtype."""
+    columns = {col: df[col].astype('category') for col in STRING_COLUMNS
+               if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype)}
+    if 'RouteAverage' in df.columns:
+        columns['RouteAverage'] = df['RouteAverage'].astype(price_dtype)
+    return df.assign(**columns)
+
+
+def _to_datetime64(value):
+    return np.datetime64(pd.Timestamp(value), 'ns')
+
+
+def _split_by_month(dates):
+    months = dates.astype('datetime64[M]')
+    labels, starts = np.unique(months, return_index=True)
+    return dict(zip(np.datetime_as_string(labels, unit='M'), np.split(dates, starts[1:])))
+
+
+class ArchiveDateIndex:
+    """
+    Выбор дат архива поверх group_dates(group) и category_dates(category):
+    списки месяцев, ближайшая дата, срезы по диапазону дат. Общая часть датасетов в памяти и в БД.
+    """
+
+    def group_dates(self, group):
+        raise NotImplementedError
+
+    def category_dates(self, category):
+        raise NotImplementedError
+
+    def _months_of(self, group):
+        # GroupDesc -> {'YYYY-MM': даты архива за месяц}, строится при первом обращении
+        if group not in self._group_months:
+            self._group_months[group] = _split_by_month(self.group_dates(group))
+        return self._group_months[group]
+
+    def category_date_slice(self, category, start_date=None, end_date=None):
+        """Позиции внутри category_dates(category) с start_date <= ArchiveDate <= end_date."""
+        dates = self.category_dates(category)
+        left = 0 if start_date is None else np.searchsorted(dates, _to_datetime64(start_date), side='left')
+        right = len(dates) if end_date is None else np.searchsorted(dates, _to_datetime64(end_date), side='right')
+        return slice(left, max(left, right))
+
+    def months(self, group):
+        """Месяцы ('YYYY-MM') с датами архива группы, от последнего к первому."""
+        return sorted(self._months_of(group), reverse=True)
+
+    def month_dates(self, group, months):
+        """Отсортированные даты архива группы за выбранные месяцы."""
+        by_month = self._months_of(group)
+        parts = [by_month[month] for month in months if month in by_month]
+        if not parts:
+            return np.array([], dtype='datetime64[ns]')
+        return np.sort(np.concatenate(parts))
+
+    def nearest_date(self, group, date, direction='backward', tolerance=None):
+        """
+        Ближайшая к date дата архива группы: 'backward' - не позже date, 'forward' - не раньше,
+        'nearest' - в любую сторону. None, если такой даты нет или она дальше tolerance.
+        """
+        dates = self.group_dates(group)
+        date = _to_datetime64(date)
+        position = np.searchsorted(dates, date, side='right' if direction == 'backward' else 'left')
+        if direction == 'backward':
+            candidates = dates[position - 1:position] if position > 0 else dates[:0]
+        elif direction == 'forward':
+            candidates = dates[position:position + 1]
+        elif direction == 'nearest':
+            candidates = dates[max(position - 1, 0):position + 1]
+        else:
+            raise ValueError(f"Неизвестное направление поиска: {direction}")
+        if not len(candidates):
+            return None
+        nearest = candidates[np.argmin(np.abs(candidates - date))]
+        if tolerance is not None and abs(nearest - date) > pd.Timedelta(tolerance).to_timedelta64():
+            return None
+        return nearest
+
+    def has_date(self, group, date):
+        dates = self.group_dates(group)
+        date = _to_datetime64(date)
+        position = np.searchsorted(dates, date)
+        return position < len(dates) and dates[position] == date
+
+
+class FFADataset(ArchiveDateIndex):
+    """
+    Таблица FFA, отсортированная по (Category, ArchiveDate), с индексом по категориям.
+    Строится один раз при загрузке файла, все выборки дальше - словарь + searchsorted.
+    Таблица компактная (category вместо строк) и общая для всех прогонов и сессий:
+    менять self.df и возвращаемые срезы нельзя, индикаторы хранятся отдельно в IndicatorStore.
+    """
+
+    def __init__(self, df, key=None, price_dtype=PRICE_DTYPE):
+        # Версия данных: хэш содержимого файла или случайный ключ для DataFrame из памяти
+        self.key = key if key is not None else uuid.uuid4().hex
+        self.price_dtype = price_dtype
+        self.df = compact_frame(df, price_dtype).sort_values(['Category', 'ArchiveDate'],
+                                                             kind='stable').reset_index(drop=True)
+        self.archive_dates = self.df['ArchiveDate'].to_numpy(dtype='datetime64[ns]')
+
+        # Категория -> (начало, конец) непрерывного блока строк
+        self._bounds = {
+            category: (positions[0], positions[-1] + 1)
+            for category, positions in self.df.groupby('Category', sort=False, observed=True).indices.items()
+        }
+
+        # GroupDesc -> отсортированный массив уникальных дат архива
+        self._group_dates = {
+            group: np.unique(self.archive_dates[positions])
+            for group, positions in self.df.groupby('GroupDesc', sort=False, observed=True).indices.items()
+        }
+
+        # GroupDesc -> {'YYYY-MM': даты архива за месяц}, для списков месяцев в интерфейсе
+        self._group_months = {group: _split_by_month(dates) for group, dates in self._group_dates.items()}
+
+    def extend(self, rows, key=None, on=('ArchiveDate', 'Category', 'Index_Label')):
+        """
+        Новая версия датасета с добавленными строками rows. Старые строки с тем же ключом on
+        заменяются; сравниваются только строки за даты архива из rows.
+        """
+        on = list(on)
+        df = self.df
+        same_dates = np.flatnonzero(np.isin(self.archive_dates, rows['ArchiveDate'].to_numpy(dtype='datetime64[ns]')))
+        if len(same_dates):
+            candidates = df.iloc[same_dates]
+            replaced = pd.MultiIndex.from_frame(candidates[on]).isin(pd.MultiIndex.from_frame(rows[on]))
+            if replaced.any():
+                df = df.drop(index=candidates.index[replaced])
+        return FFADataset(pd.concat([df, rows.reindex(columns=df.columns)], ignore_index=True), key=key,
+                          price_dtype=self.price_dtype)
+
+    @property
+    def categories(self):
+        return list(self._bounds)
+
+    def category_slice(self, category):
+        """Позиции строк категории в self.df (пустой срез, если категории нет)."""
+        start, stop = self._bounds.get(category, (0, 0))
+        return slice(start, stop)
+
+    def category_dates(self, category):
+        return self.archive_dates[self.category_slice(category)]
+
+    def date_slice(self, category, start_date=None, end_date=None):
+        """Позиции строк категории в self.df с start_date <= ArchiveDate <= end_date."""
+        start = self.category_slice(category).start
+        rows = self.category_date_slice(category, start_date, end_date)
+        return slice(start + rows.start, start + rows.stop)
+
+    def category(self, category):
+        return self.df.iloc[self.category_slice(category)]
+
+    def category_range(self, category, start_date=None, end_date=None):
+        """Строки категории с start_date <= ArchiveDate <= end_date (границы включительно)."""
+        return self.df.iloc[self.date_slice(category, start_date, end_date)]
+
+    def category_on(self, category, date):
+        return self.category_range(category, date, date)
+
+    def categories_on(self, categories, dates):
+        """Строки категорий на каждую дату архива: {(category, date): строки}."""
+        return {(category, date): self.category_on(category, date) for date in dates for category in categories}
+
+    def history(self, categories, start_date=None, end_date=None):
+        parts = [self.category_range(category, start_date, end_date) for category in categories]
+        if not parts:
+            return self.df.iloc[0:0]
+        return pd.concat(parts)
+
+    def group_dates(self, group):
+        return self._group_dates.get(group, np.array([], dtype='datetime64[ns]'))
+
@@ -0,0 +1,50 @@
+import io
+import threading
+
+from cachetools import LRUCache
+
+# Ограничение по памяти на все закэшированные картинки процесса
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def figure_to_png(fig, dpi=200):
+    """PNG-байты фигуры с теми же настройками, что у st.pyplot."""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+class FigureCache:
+    """
+    LRU-кэш отрисованных графиков (PNG) по ключу (версия датасета, ForecastParams).
+    Размер считается в байтах PNG, при превышении лимита вытесняются самые старые.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self._cache = LRUCache(maxsize=max_bytes, getsizeof=len)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(dataset, params):
+        # ForecastParams - frozen dataclass, поэтому ключ хэшируемый и сравнивается по значению
+        return dataset.key, params
+
+    def get(self, key):
+        with self._lock:
+            return self._cache.get(key)
+
+    def put(self, key, png):
+        with self._lock:
+            try:
+                self._cache[key] = png
+            except ValueError:
+                # Картинка больше всего лимита - просто не кэшируем
+                pass
+
+    @property
+    def current_bytes(self):
+        return self._cache.currsize
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
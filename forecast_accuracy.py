@@ -0,0 +1,236 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+
+# Индекс, по среднему которого рассчитываются контракты группы FFA
+UNDERLYING = {
+    'BFA Cape': 'C5TC FACT',
+    'BFA Panamax': 'P5TC FACT',
+}
+# Длина контракта в месяцах: расчетная цена - среднее индекса за весь период
+CONTRACT_MONTHS = {
+    'Monthly Contract (MON)': 1,
+    'Quarterly Contract (Q)': 3,
+    'Calendar Year Contract (CAL)': 12,
+}
+ACCURACY_COLUMNS = ['Category', 'Underlying', 'ArchiveDate', 'Index_Label', 'StartDate', 'HorizonMonths',
+                    'Forecast', 'Spot', 'Realized', 'Days', 'Settled', 'Error', 'AbsError', 'PctError', 'SpotError']
+_LABEL_COLUMNS = ['Category', 'Underlying', 'Index_Label']
+_MONTHLY_COLUMNS = ['Month', 'Sum', 'Count', 'Underlying']
+
+
+def _month_numbers(dates):
+    """Номер месяца (месяцы от 1970-01) для массива дат."""
+    return np.asarray(dates, dtype='datetime64[ns]').astype('datetime64[M]').astype(np.int64)
+
+
+def monthly_sums(dataset, underlying, start_month=None):
+    """Сумма и число дневных значений индекса по месяцам (Month - номер месяца), начиная с start_month."""
+    start_date = None if start_month is None else pd.Timestamp(np.datetime64(int(start_month), 'M'))
+    facts = dataset.category_range(underlying, start_date)
+    prices = facts['RouteAverage'].to_numpy(dtype=float)
+    valid = ~np.isnan(prices)
+    frame = pd.DataFrame({'Month': _month_numbers(facts['ArchiveDate'])[valid], 'Sum': prices[valid]})
+    monthly = frame.groupby('Month')['Sum'].agg(['sum', 'count']).rename(columns={'sum': 'Sum', 'count': 'Count'})
+    return monthly.reset_index().assign(Underlying=underlying)
+
+
+def _realized(monthly, last_months, underlying, start_months, end_months):
+    """
+    Среднее индекса за месяцы start..end каждого контракта через накопленные суммы по сетке месяцев.
+    Для еще не закончившихся периодов - среднее по имеющимся дням, Settled=False.
+    """
+    realized = np.full(len(start_months), np.nan)
+    days = np.zeros(len(start_months), dtype=np.int64)
+    settled = np.zeros(len(start_months), dtype=bool)
+    for name in pd.unique(underlying):
+        rows = np.flatnonzero(underlying == name)
+        part = monthly[monthly['Underlying'] == name]
+        if part.empty:
+            continue
+        first = int(part['Month'].min())
+        grid = int(part['Month'].max()) - first + 1
+        sums = np.zeros(grid + 1)
+        counts = np.zeros(grid + 1, dtype=np.int64)
+        positions = part['Month'].to_numpy() - first + 1
+        sums[positions] = part['Sum'].to_numpy()
+        counts[positions] = part['Count'].to_numpy()
+        sums, counts = np.cumsum(sums), np.cumsum(counts)
+
+        low = np.clip(start_months[rows] - first, 0, grid)
+        high = np.clip(end_months[rows] - first + 1, 0, grid)
+        total, n = sums[high] - sums[low], counts[high] - counts[low]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            realized[rows] = np.where(n > 0, total / n, np.nan)
+        days[rows] = n
+        # Период закрыт, когда в данных уже есть следующий за ним месяц
+        settled[rows] = (n > 0) & (last_months[name] > end_months[rows])
+    return realized, days, settled
+
+
+def _with_realized(table, monthly, last_months):
+    start_months = _month_numbers(table['StartDate'])
+    end_months = start_months + table['Category'].map(CONTRACT_MONTHS).to_numpy(dtype=np.int64) - 1
+    realized, days, settled = _realized(monthly, last_months, table['Underlying'].to_numpy(dtype=object),
+                                        start_months, end_months)
+    forecast = table['Forecast'].to_numpy(dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return table.assign(
+            Realized=realized, Days=days, Settled=settled,
+            Error=forecast - realized,
+            AbsError=np.abs(forecast - realized),
+            PctError=(forecast - realized) / realized,
+            SpotError=table['Spot'].to_numpy(dtype=float) - realized,
+        )
+
+
+class AccuracyTable:
+    """
+    Материализованная таблица "прогноз против факта": каждая точка кривой FFA (дата архива, контракт)
+    с горизонтом в месяцах, спотом индекса на дату прогноза и средним индекса за период контракта.
+    Сводки по горизонтам и контрактам считаются группировкой готовой таблицы.
+    """
+
+    def __init__(self, table, monthly, last_months):
+        self.table = table
+        self.monthly = monthly
+        self.last_months = last_months
+
+    @classmethod
+    def build(cls, dataset):
+        empty = cls(pd.DataFrame(columns=ACCURACY_COLUMNS), pd.DataFrame(columns=_MONTHLY_COLUMNS), {})
+        return empty.extend(dataset)
+
+    def extend(self, dataset, start_date=None):
+        """
+        Новая таблица с датами архива >= start_date из dataset (по умолчанию - после последней даты таблицы).
+        Строки с этих дат пересчитываются заново, у остальных обновляется только факт
+        тех контрактов, чей период заходит на месяцы с новыми данными индекса.
+        """
+        if start_date is None and len(self.table):
+            start_date = self.table['ArchiveDate'].iloc[-1] + pd.Timedelta(1, 'ns')
+        start_date = None if start_date is None else pd.Timestamp(start_date)
+        start_month = None if start_date is None else int(_month_numbers([start_date])[0])
+
+        underlyings = [name for name in UNDERLYING.values() if name in dataset.categories]
+        last_months = dict(self.last_months)
+        monthly = [self.monthly[self.monthly['Month'] < start_month]] if start_month is not None else []
+        facts = []
+        for underlying in underlyings:
+            monthly.append(monthly_sums(dataset, underlying, start_month))
+            dates = dataset.category_dates(underlying)
+            if len(dates):
+                last_months[underlying] = int(_month_numbers(dates[-1:])[0])
+            # Спот на дату прогноза: последняя дата индекса не позже даты архива
+            spot = dataset.category_range(underlying)
+            facts.append(pd.DataFrame({'Underlying': underlying, 'ArchiveDate': spot['ArchiveDate'].to_numpy(),
+                                       'Spot': spot['RouteAverage'].to_numpy(dtype=float)}))
+        monthly = pd.concat(monthly, ignore_index=True) if monthly else self.monthly
+
+        new_rows = self._forecast_rows(dataset, start_date, facts)
+        old = self.table if start_date is None else self.table[self.table['ArchiveDate'] < start_date]
+        if start_month is not None and len(old):
+            # Факт меняется только у контрактов, заканчивающихся в месяце start_date или позже,
+            # а Settled - еще и у незакрытых периодов, если в индексе начался новый месяц
+            refresh_month = min([start_month] + list(self.last_months.values()))
+            end_months = _month_numbers(old['StartDate']) + old['Category'].map(CONTRACT_MONTHS).to_numpy(
+                dtype=np.int64) - 1
+            touched = end_months >= refresh_month
+            if touched.any():
+                old = old.copy()
+                old.loc[touched] = _with_realized(old[touched], monthly, last_months)
+        new_rows = _with_realized(new_rows, monthly, last_months)
+
+        table = pd.concat([old, new_rows], ignore_index=True) if len(old) else new_rows
+        for col in _LABEL_COLUMNS:
+            table[col] = table[col].astype('category')
+        return AccuracyTable(table[ACCURACY_COLUMNS], monthly, last_months)
+
+    @staticmethod
+    def _forecast_rows(dataset, start_date, facts):
+        parts = [dataset.category_range(category, start_date) for category in CONTRACT_MONTHS
+                 if category in dataset.categories]
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return pd.DataFrame(columns=ACCURACY_COLUMNS)
+        points = pd.concat(parts, ignore_index=True)
+        forecasts = pd.DataFrame({
+            'Category': points['Category'].to_numpy(dtype=object),
+            'Underlying': points['GroupDesc'].to_numpy(dtype=object),
+            'ArchiveDate': points['ArchiveDate'].to_numpy(dtype='datetime64[ns]'),
+            'Index_Label': points['Index_Label'].to_numpy(dtype=object),
+            'StartDate': points['StartDate'].to_numpy(dtype='datetime64[ns]'),
+            'Forecast': points['RouteAverage'].to_numpy(dtype=float),
+        })
+        forecasts['Underlying'] = forecasts['Underlying'].map(UNDERLYING)
+        forecasts = forecasts[forecasts['Underlying'].notna() & forecasts['StartDate'].notna()]
+        forecasts['HorizonMonths'] = _month_numbers(forecasts['StartDate']) - _month_numbers(forecasts['ArchiveDate'])
+
+        # merge_asof требует сортировки по ключу; stable сохраняет порядок контрактов внутри даты
+        forecasts = forecasts.sort_values('ArchiveDate', kind='stable')
+        facts = pd.concat(facts, ignore_index=True) if facts else pd.DataFrame(
+            columns=['Underlying', 'ArchiveDate', 'Spot'])
+        facts = facts.dropna(subset=['Spot']).sort_values('ArchiveDate', kind='stable')
+        facts['ArchiveDate'] = facts['ArchiveDate'].astype('datetime64[ns]')
+        forecasts = pd.merge_asof(forecasts, facts, on='ArchiveDate', by='Underlying', direction='backward')
+        return forecasts
+
+    def summary(self, by=('Category', 'HorizonMonths'), start_date=None, end_date=None, settled_only=True):
+        """
+        Ошибка прогнозов, сделанных в start_date..end_date, по группам by:
+        смещение (средняя ошибка), MAE, RMSE, MAPE и MAE наивного прогноза "спот не изменится".
+        """
+        table = self.table
+        dates = table['ArchiveDate'].to_numpy()
+        low = 0 if start_date is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date)), 'left')
+        high = len(dates) if end_date is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end_date)),
+                                                                   'right')
+        table = table.iloc[low:high]
+        if settled_only:
+            table = table[table['Settled']]
+        table = table.dropna(subset=['Error'])
+        table = table.assign(SquaredError=table['Error'] ** 2, AbsPctError=table['PctError'].abs(),
+                             SpotAbsError=table['SpotError'].abs())
+        grouped = table.groupby(list(by), observed=True)
+        summary = pd.DataFrame({
+            'Points': grouped.size(),
+            'Bias': grouped['Error'].mean(),
+            'MAE': grouped['AbsError'].mean(),
+            'RMSE': np.sqrt(grouped['SquaredError'].mean()),
+            'MAPE': grouped['AbsPctError'].mean(),
+            'SpotMAE': grouped['SpotAbsError'].mean(),
+        })
+        return summary.reset_index()
+
+
+class AccuracyStore:
+    """Таблицы точности по версии датасета; новая версия архива продлевает таблицу прошлой версии."""
+
+    def __init__(self, maxsize=4):
+        self._cache = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def get(self, dataset):
+        with self._lock:
+            table = self._cache.get(dataset.key)
+        if table is None:
+            table = AccuracyTable.build(dataset)
+            with self._lock:
+                self._cache[dataset.key] = table
+        return table
+
+    def extend(self, previous, dataset, start_date):
+        """Если для previous таблица уже построена, досчитывает ее с start_date для dataset."""
+        with self._lock:
+            table = self._cache.get(previous.key)
+        if table is None:
+            return
+        table = table.extend(dataset, start_date)
+        with self._lock:
+            self._cache[dataset.key] = table
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
@@ -0,0 +1,186 @@
+import threading
+
+import numpy as np
+from cachetools import LRUCache
+
+INDICATORS = ('sma', 'std', 'ewma')
+
+# Длина блока для EWMA: внутри блока рекурсия раскрывается в матричное умножение
+_EWMA_BLOCK = 128
+
+
+def rolling_mean_std(values, windows):
+    """
+    Скользящие среднее и стандартное отклонение сразу для всех окон.
+    Один проход cumsum по сумме и сумме квадратов, дальше для каждого окна только разность.
+    Семантика как у pandas: SMA с min_periods=1, std с ddof=1 и min_periods=window.
+    Возвращает два массива формы (len(windows), len(values)).
+    """
+    x = np.asarray(values, dtype=float)
+    windows = np.asarray(windows, dtype=np.int64).reshape(-1, 1)
+    valid = ~np.isnan(x)
+    # Сдвиг на среднее уменьшает потерю точности в сумме квадратов
+    shift = x[valid].mean() if valid.any() else 0.0
+    centered = np.where(valid, x - shift, 0.0)
+
+    sum_1 = np.concatenate(([0.0], np.cumsum(centered)))
+    sum_2 = np.concatenate(([0.0], np.cumsum(centered * centered)))
+    count = np.concatenate(([0], np.cumsum(valid)))
+
+    right = np.arange(1, len(x) + 1).reshape(1, -1)
+    left = np.maximum(right - windows, 0)
+    s1 = sum_1[right] - sum_1[left]
+    s2 = sum_2[right] - sum_2[left]
+    n = count[right] - count[left]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(n > 0, s1 / n, np.nan)
+        variance = np.maximum(s2 - s1 * mean, 0.0) / (n - 1)
+    std = np.where((n >= windows) & (n > 1), np.sqrt(variance), np.nan)
+    return mean + shift, std
+
+
+def _ewma_with_gaps(x, alphas):
+    # Повторяет pandas ewm(adjust=False, ignore_na=False) для рядов с пропусками
+    out = np.empty((len(alphas), len(x)))
+    weighted = np.full(len(alphas), x[0])
+    old_weight = np.ones(len(alphas))
+    out[:, 0] = weighted
+    for i in range(1, len(x)):
+        current = x[i]
+        observed = current == current
+        started = weighted == weighted
+        old_weight = np.where(started, old_weight * (1.0 - alphas), old_weight)
+        if observed:
+            mixed = (old_weight * weighted + alphas * current) / (old_weight + alphas)
+            weighted = np.where(started, mixed, current)
+            old_weight = np.ones(len(alphas))
+        out[:, i] = weighted
+    return out
+
+
+def ewma(values, spans):
+    """
+    EWMA (span, adjust=False) сразу для всех span.
+    Рекурсия идет блоками: внутри блока она раскрыта в треугольную матрицу весов,
+    между блоками передается только последнее значение.
+    Возвращает массив формы (len(spans), len(values)).
+    """
+    x = np.asarray(values, dtype=float)
+    alphas = 2.0 / (np.asarray(spans, dtype=float) + 1.0)
+    if len(x) == 0:
+        return np.empty((len(alphas), 0))
+    if np.isnan(x).any():
+        return _ewma_with_gaps(x, alphas)
+
+    decay = 1.0 - alphas
+    block = min(_EWMA_BLOCK, len(x))
+    lags = np.arange(block)
+    lag_matrix = lags.reshape(-1, 1) - lags.reshape(1, -1)
+    # kernel[k, i, j] = alpha_k * decay_k ** (i - j) для j <= i
+    kernel = np.where(lag_matrix >= 0,
+                      decay.reshape(-1, 1, 1) ** np.maximum(lag_matrix, 0),
+                      0.0) * alphas.reshape(-1, 1, 1)
+    carry = decay.reshape(-1, 1) ** (lags + 1)
+
+    out = np.empty((len(alphas), len(x)))
+    previous = np.full(len(alphas), x[0])
+    for start in range(0, len(x), block):
+        chunk = x[start:start + block]
+        size = len(chunk)
+        values_block = kernel[:, :size, :size] @ chunk + carry[:, :size] * previous.reshape(-1, 1)
+        out[:, start:start + size] = values_block
+        previous = values_block[:, -1]
+    return out
+
+
+class IndicatorStore:
+    """
+    Кэш индикаторов по ключу (версия датасета, категория, индикатор, окно).
+    Каждый ряд считается один раз на всю историю категории, диапазон дат - только срез.
+    Недостающие окна одной категории считаются одним батчем.
+    """
+
+    def __init__(self, maxsize=256):
+        self._cache = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def _compute(self, dataset, category, indicator, windows):
+        prices = dataset.category(category)['RouteAverage'].to_numpy(dtype=float)
+        if indicator == 'ewma':
+            results = {'ewma': ewma(prices, windows)}
+        elif indicator in ('sma', 'std'):
+            # SMA и std получаются из одного прохода, кладем в кэш оба
+            means, stds = rolling_mean_std(prices, windows)
+            results = {'sma': means, 'std': stds}
+        else:
+            raise ValueError(f"Неизвестный индикатор: {indicator}")
+
+        computed = {}
+        with self._lock:
+            for name, matrix in results.items():
+                computed[name] = dict(zip(windows, matrix))
+                for window, values in computed[name].items():
+                    values.setflags(write=False)
+                    self._cache[(dataset.key, category, name, window)] = values
+        return computed[indicator]
+
+    def get(self, dataset, category, indicator, windows):
+        """{окно: значения} для всех строк категории (в порядке ArchiveDate), только для чтения."""
+        windows = list(dict.fromkeys(int(window) for window in windows))
+        with self._lock:
+            found = {window: self._cache.get((dataset.key, category, indicator, window)) for window in windows}
+        missing = [window for window, values in found.items() if values is None]
+        if missing:
+            found.update(self._compute(dataset, category, indicator, missing))
+        return found
+
+    def series(self, dataset, category, indicator, windows, start_date=None, end_date=None):
+        """(даты, {окно: значения}) в диапазоне start_date..end_date включительно."""
+        rows = dataset.category_date_slice(category, start_date, end_date)
+        values = self.get(dataset, category, indicator, windows)
+        return dataset.category_dates(category)[rows], {window: series[rows] for window, series in values.items()}
+
+    def extend(self, previous, dataset):
+        """
+        Переносит закэшированные ряды версии previous на новую версию dataset.
+        Если у категории только добавились строки в конце, досчитывается лишь хвост:
+        SMA/std по последним window - 1 значениям истории, EWMA - от последнего значения ряда.
+        Категории, где изменилась уже посчитанная история, пересчитаются при первом запросе.
+        """
+        with self._lock:
+            cached = {}
+            for (key, category, indicator, window), values in self._cache.items():
+                if key == previous.key:
+                    cached.setdefault(category, {}).setdefault(indicator, {})[window] = values
+
+        for category, indicators in cached.items():
+            old = previous.category(category)['RouteAverage'].to_numpy(dtype=float)
+            new = dataset.category(category)['RouteAverage'].to_numpy(dtype=float)
+            n_old = len(old)
+            if len(new) < n_old or not np.array_equal(new[:n_old], old, equal_nan=True):
+                continue
+
+            extended = {}
+            rolling = sorted(set(indicators.get('sma', {})) | set(indicators.get('std', {})))
+            if rolling:
+                start = max(n_old - max(rolling) + 1, 0)
+                means, stds = rolling_mean_std(new[start:], rolling)
+                for name, matrix in (('sma', means), ('std', stds)):
+                    for window, tail in zip(rolling, matrix):
+                        if window in indicators.get(name, {}):
+                            extended[(name, window)] = np.concatenate([indicators[name][window], tail[n_old - start:]])
+            # Состояние EWMA - только последнее значение, если последняя цена не пропуск
+            if n_old and not np.isnan(old[-1]):
+                for span, values in indicators.get('ewma', {}).items():
+                    tail = ewma(np.concatenate(([values[-1]], new[n_old:])), [span])[0, 1:]
+                    extended[('ewma', span)] = np.concatenate([values, tail])
+
+            with self._lock:
+                for (name, window), values in extended.items():
+                    values.setflags(write=False)
+                    self._cache[(dataset.key, category, name, window)] = values
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
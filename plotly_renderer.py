@@ -0,0 +1,177 @@
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from chart_styles import (EWMA_COLORS, SMA_COLORS, STD_COLORS, category_colors, full_color_name,
+                          indicator_style, thin_labels)
+from ffa_analytics import RATIO_TYPE
+
+# Примерно ширина контейнера страницы в пикселях: больше точек на экране все равно не видно
+DEFAULT_MAX_POINTS = 1300
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Индексы точек после прореживания Largest-Triangle-Three-Buckets.
+    Первая и последняя точки сохраняются, пропуски (NaN) в отбор не попадают.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    finite = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    n = len(finite)
+    if threshold >= n or threshold < 3:
+        return finite
+    x, y = x[finite], y[finite]
+
+    # Границы корзин: первая и последняя точки - отдельные корзины
+    edges = np.floor(np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges = np.append(edges, n)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    anchor = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2]
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        area = np.abs((x[anchor] - next_x) * (y[start:end] - y[anchor])
+                      - (x[anchor] - x[start:end]) * (next_y - y[anchor]))
+        anchor = start + int(np.argmax(area))
+        selected[bucket + 1] = anchor
+    return finite[selected]
+
+
+def _decimate(dates, values, max_points):
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    positions = lttb_indices(dates.astype(np.int64), values, max_points)
+    return dates[positions], np.asarray(values, dtype=float)[positions]
+
+
+def _signal_labels(signal_type, signals):
+    # Подписи только у прореженных по плотности сигналов, маркеры остаются у всех
+    labels = np.full(len(signals), '', dtype=object)
+    positions = thin_labels(signals['ArchiveDate'].to_numpy())
+    labels[positions] = [f"{signal_type} ({threshold})" for threshold in signals['Threshold'].to_numpy()[positions]]
+    return labels
+
+
+def _add_spread(fig, spread, row, max_points):
+    spec = spread.spec
+    dates, values = _decimate(spread.frame['ArchiveDate'], spread.frame['Ratio'], max_points)
+    fig.add_trace(go.Scattergl(x=dates, y=values, mode='lines', name=spec.name, line=dict(color='teal')),
+                  row=row, col=1)
+    for thresholds, color in ((spec.low_thresholds, 'blue'), (spec.high_thresholds, 'purple')):
+        for threshold in thresholds:
+            fig.add_hline(y=threshold, line=dict(color=color, dash='dot', width=1), row=row, col=1)
+    for signal_type, color, symbol in (('L', 'blue', 'triangle-up'), ('S', 'purple', 'triangle-down')):
+        signals = spread.signals[spread.signals['Type'] == signal_type]
+        if signals.empty:
+            continue
+        fig.add_trace(go.Scatter(x=signals['ArchiveDate'], y=signals['Ratio'], mode='markers',
+                                 marker=dict(color=color, symbol=symbol, size=9), showlegend=False,
+                                 hovertext=[f"{signal_type} ({threshold})" for threshold in signals['Threshold']],
+                                 name=spec.name),
+                      row=row, col=1)
+    fig.update_yaxes(title_text=spec.name, row=row, col=1)
+
+
+def render_plotly(result, max_points=DEFAULT_MAX_POINTS):
+    """
+    График ForecastResult на WebGL-трассах plotly.
+    Исторические ряды и индикаторы прорежены LTTB до max_points на выбранном диапазоне дат,
+    поэтому сужение диапазона слайдером дает полное разрешение.
+    """
+    params = result.params
+    # Вместе с Brent отношение C5TC / P5TC уходит на свою панель, спреды - панели ниже
+    ratio_panel = (result.ratio is not None and RATIO_TYPE in params.historical_data_types
+                   and "Brent Oil" in params.historical_data_types)
+    n_panels = int(ratio_panel) + len(result.spreads)
+    fig = make_subplots(rows=1 + n_panels, cols=1, shared_xaxes=True, vertical_spacing=0.04,
+                        row_heights=[8] + [3] * n_panels,
+                        specs=[[{'secondary_y': True}]] + [[{}]] * n_panels)
+    ratio_target = dict(row=2, col=1) if ratio_panel else dict(secondary_y=True)
+    history = {series.category: series for series in result.history}
+
+    for data_type in params.historical_data_types:
+        if data_type == RATIO_TYPE:
+            merged_data = result.ratio
+            if merged_data is None:
+                continue
+            dates, ratio = _decimate(merged_data['ArchiveDate'], merged_data['Ratio'], max_points)
+            fig.add_trace(go.Bar(x=dates, y=ratio, name='C5TC / P5TC Ratio', opacity=0.3,
+                                 marker_color=np.where(ratio > 1, 'green', 'red'), marker_line_width=0),
+                          **ratio_target)
+            for signal_type, color, symbol, position in (('L', 'blue', 'triangle-up', 'top center'),
+                                                         ('S', 'purple', 'triangle-down', 'bottom center')):
+                signals = result.signals[result.signals['Type'] == signal_type]
+                if signals.empty:
+                    continue
+                fig.add_trace(go.Scatter(
+                    x=signals['ArchiveDate'], y=signals['Ratio'], mode='markers+text',
+                    marker=dict(color=color, symbol=symbol, size=12),
+                    text=_signal_labels(signal_type, signals),
+                    textposition=position, textfont=dict(color=color),
+                    name='Low Signal (пробой вниз)' if signal_type == 'L' else 'High Signal (пробой вверх)'),
+                    **ratio_target)
+            fig.update_yaxes(title_text="C5TC / P5TC Ratio", **ratio_target)
+        elif data_type == "Brent Oil":
+            series = history[data_type]
+            dates, values = _decimate(series.dates, series.values, max_points)
+            fig.add_trace(go.Scattergl(x=dates, y=values, mode='lines', name='Brent Oil',
+                                       line=dict(color='green')), secondary_y=True)
+            fig.update_yaxes(title_text="Brent Oil Price", secondary_y=True)
+        else:
+            series = history[data_type]
+            dates, values = _decimate(series.dates, series.values, max_points)
+            fig.add_trace(go.Scattergl(x=dates, y=values, mode='lines', name=f'Actual ({data_type})'))
+
+    colors = category_colors(params.forecast_types)
+    for curve in result.forecasts:
+        fig.add_trace(go.Scattergl(
+            x=curve.start_dates, y=curve.values, name=curve.label,
+            mode='lines' if curve.averaged else 'lines+markers',
+            line=dict(color=colors[curve.category], dash='dash' if curve.averaged else 'solid',
+                      width=2 if curve.averaged else 1.5),
+            opacity=1.0 if curve.averaged else 0.8))
+
+    categories = dict.fromkeys(series.category for series in result.indicators)
+    for category in categories:
+        for position, window in enumerate(params.sma_windows):
+            sma = result.indicator(category, 'sma', window)
+            positions = lttb_indices(np.asarray(sma.dates, dtype='datetime64[ns]').astype(np.int64),
+                                     sma.values, max_points)
+            dates = sma.dates[positions]
+            std = result.indicator(category, 'std', window)
+            if std is not None:
+                # Полоса std: нижняя граница без заливки, верхняя с заливкой до нее
+                color = full_color_name(indicator_style(STD_COLORS, window, position))
+                fig.add_trace(go.Scattergl(x=dates, y=sma.values[positions] - std.values[positions],
+                                           mode='lines', line=dict(width=0, color=color),
+                                           showlegend=False, hoverinfo='skip'))
+                fig.add_trace(go.Scattergl(x=dates, y=sma.values[positions] + std.values[positions],
+                                           mode='lines', line=dict(width=0, color=color), fill='tonexty',
+                                           opacity=0.2, name=f'{window}-day Rolling Std Area'))
+            fig.add_trace(go.Scattergl(x=dates, y=sma.values[positions], mode='lines', opacity=0.6,
+                                       line=dict(dash='dash',
+                                                 color=full_color_name(indicator_style(SMA_COLORS, window, position))),
+                                       name=f'{window}-day SMA ({category})'))
+
+        for position, span in enumerate(params.ewma_spans):
+            ewma = result.indicator(category, 'ewma', span)
+            dates, values = _decimate(ewma.dates, ewma.values, max_points)
+            fig.add_trace(go.Scattergl(x=dates, y=values, mode='lines', opacity=0.6,
+                                       line=dict(color=full_color_name(indicator_style(EWMA_COLORS, span, position))),
+                                       name=f'{span}-day EWMA ({category})'))
+
+    for row, spread in enumerate(result.spreads, start=2 + int(ratio_panel)):
+        _add_spread(fig, spread, row, max_points)
+
+    fig.update_layout(
+        title=dict(text="FFA Forecast vs Actual", font=dict(size=20, color='darkblue')),
+        height=650 + 220 * n_panels,
+        showlegend=len(params.dates) <= 9 or params.average_forcast_mode,
+        hovermode='x',
+        xaxis=dict(title_text="Дата", tickformat='%b %Y'),
+    )
+    fig.update_yaxes(title_text="Route Average", row=1, col=1, secondary_y=False)
+    return fig
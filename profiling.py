@@ -0,0 +1,93 @@
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+
+logger = logging.getLogger('bdi_app.metrics')
+
+# Файл для метрик в формате JSON Lines (одна строка на прогон), если задан
+METRICS_LOG = os.environ.get('BDI_METRICS_LOG')
+
+_export_lock = threading.Lock()
+
+
+class StageProfiler:
+    """
+    Замер длительности (и по желанию пиковой памяти через tracemalloc) этапов одного прогона.
+    Этапы плоские: вложенные stage() не поддерживаются, так как сбрасывают пик памяти.
+    """
+
+    def __init__(self, interaction='rerun', session=None, trace_memory=False):
+        self.interaction = interaction
+        self.session = session
+        self.trace_memory = trace_memory
+        self.spans = []
+
+    @contextmanager
+    def stage(self, name, **details):
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            span = {'stage': name, 'seconds': time.perf_counter() - start}
+            if self.trace_memory:
+                span['peak_bytes'] = max(tracemalloc.get_traced_memory()[1] - memory_before, 0)
+                if started_tracing:
+                    tracemalloc.stop()
+            span.update(details)
+            self.spans.append(span)
+
+    @property
+    def total_seconds(self):
+        return sum(span['seconds'] for span in self.spans)
+
+    def as_frame(self):
+        frame = pd.DataFrame(self.spans)
+        if frame.empty:
+            return frame
+        frame['ms'] = (frame.pop('seconds') * 1000).round(1)
+        if 'peak_bytes' in frame:
+            frame['peak_MB'] = (frame.pop('peak_bytes') / 2 ** 20).round(2)
+        return frame
+
+    def record(self):
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'session': self.session,
+            'interaction': self.interaction,
+            'total_seconds': self.total_seconds,
+            'stages': self.spans,
+        }
+
+    def export(self, path=None):
+        """Пишет прогон в лог метрик (JSON Lines) и в logger bdi_app.metrics."""
+        record = self.record()
+        logger.info("%s", json.dumps(record, ensure_ascii=False, default=str))
+        path = path or METRICS_LOG
+        if path:
+            with _export_lock, open(path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        return record
+
+
+class _NullProfiler(StageProfiler):
+    @contextmanager
+    def stage(self, name, **details):
+        yield
+
+
+# Заглушка по умолчанию, чтобы код расчета не проверял profiler на None
+NULL_PROFILER = _NullProfiler()
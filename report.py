@@ -0,0 +1,214 @@
+"""
+Пакетная выгрузка графиков и таблиц без Streamlit.
+
+    python report.py --workbook bfa.xlsx --last-months 12 --output reports
+    python report.py --store --spec month_end.json --formats png pdf csv
+
+На каждый месяц и тип прогноза - график "Месяц целиком" (PNG/PDF) и таблица прогнозов (CSV),
+на каждый месяц - сигналы C5TC / P5TC и спредов из задания (CSV).
+"""
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, fields
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import pandas as pd
+
+import data_cache
+from archive_store import STORE_DIR, ArchiveStore
+from bdi_plot_maker import FFAForecastPlotter
+from ffa_dataset import FFADataset
+from indicators import IndicatorStore
+from spreads import parse_spreads
+
+FORMATS = ('png', 'pdf', 'csv')
+
+# Датасет в процессе-воркере: передается один раз через initializer
+_worker_dataset = None
+_worker_indicators = None
+
+
+@dataclass
+class ReportSpec:
+    """Что выгружать; значения по умолчанию совпадают с настройками приложения."""
+    months: list = field(default_factory=list)
+    last_months: int = 1
+    forecast_types: list = field(default_factory=lambda: ['Monthly Contract (MON)', 'Quarterly Contract (Q)',
+                                                          'Calendar Year Contract (CAL)'])
+    historical_data_types: list = field(default_factory=lambda: ['C5TC FACT', 'P5TC FACT', 'C5TC / P5TC'])
+    # Сколько месяцев истории до конца отчетного месяца показывать на графике
+    history_months: int = 12
+    average_forcast_mode: bool = False
+    average_forcast_mode_group: object = False
+    sma_windows: list = field(default_factory=list)
+    ewma_spans: list = field(default_factory=list)
+    std_windows: list = field(default_factory=list)
+    low_thresholds: list = field(default_factory=lambda: [0.75, 0.5])
+    high_thresholds: list = field(default_factory=lambda: [1.75, 2.0])
+    # Строки спредов в формате поля "Спреды" приложения, например "C5TC - P5TC; L: -2000; S: 5000"
+    spreads: list = field(default_factory=list)
+    formats: list = field(default_factory=lambda: list(FORMATS))
+    dpi: int = 200
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, encoding='utf-8') as file:
+            values = json.load(file)
+        unknown = set(values) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"Неизвестные поля в задании: {', '.join(sorted(unknown))}")
+        return cls(**values)
+
+
+def _slug(text):
+    return re.sub(r'[^0-9A-Za-z]+', '_', text).strip('_')
+
+
+def report_months(dataset, spec):
+    """Месяцы отчета: явно заданные или last_months последних месяцев с датами BFA Cape."""
+    available = dataset.months('BFA Cape')
+    if spec.months:
+        missing = [month for month in spec.months if month not in available]
+        if missing:
+            raise ValueError(f"Нет дат BFA Cape за месяцы: {', '.join(missing)}")
+        return sorted(spec.months)
+    return sorted(available[:spec.last_months])
+
+
+def report_jobs(dataset, spec):
+    """Задания (месяц, тип прогноза, даты архива месяца, начало и конец истории)."""
+    jobs = []
+    for month in report_months(dataset, spec):
+        dates = dataset.month_dates('BFA Cape', [month])
+        end_date = pd.Timestamp(dates[-1])
+        start_date = pd.Period(month, 'M').to_timestamp() - pd.DateOffset(months=spec.history_months - 1)
+        for forecast_type in spec.forecast_types:
+            jobs.append((month, forecast_type, list(pd.DatetimeIndex(dates)), start_date, end_date))
+    return jobs
+
+
+def render_job(dataset, spec, job, output, indicator_store=None):
+    """Один график и его таблицы; возвращает список записанных файлов."""
+    month, forecast_type, dates, start_date, end_date = job
+    directory = os.path.join(output, month)
+    os.makedirs(directory, exist_ok=True)
+    name = _slug(forecast_type)
+
+    plotter = FFAForecastPlotter(dataset, spec.sma_windows, spec.ewma_spans, spec.std_windows,
+                                 indicator_store=indicator_store)
+    result = plotter.compute(spec.historical_data_types, [forecast_type], dates, start_date, end_date,
+                             spec.average_forcast_mode, spec.average_forcast_mode_group,
+                             spec.low_thresholds, spec.high_thresholds, parse_spreads('\n'.join(spec.spreads)))
+    written = []
+    if 'png' in spec.formats or 'pdf' in spec.formats:
+        fig = plotter.render(result)
+        fig.suptitle(f"{forecast_type}, {month}")
+        for fmt in ('png', 'pdf'):
+            if fmt in spec.formats:
+                path = os.path.join(directory, f'{name}.{fmt}')
+                fig.savefig(path, format=fmt, dpi=spec.dpi, bbox_inches='tight')
+                written.append(path)
+        plt.close(fig)
+
+    if 'csv' in spec.formats:
+        for category, table in result.pivot_tables.items():
+            path = os.path.join(directory, f'{_slug(category)}_table.csv')
+            table.to_csv(path)
+            written.append(path)
+        # Сигналы не зависят от типа прогноза - пишем один раз на месяц
+        if forecast_type == spec.forecast_types[0]:
+            path = os.path.join(directory, 'signals.csv')
+            signals = result.signals if result.signals is not None else pd.DataFrame()
+            signals.to_csv(path, index=False)
+            written.append(path)
+            for spread in result.spreads:
+                path = os.path.join(directory, f'signals_{_slug(spread.spec.name)}.csv')
+                spread.signals.to_csv(path, index=False)
+                written.append(path)
+    return written
+
+
+def _init_worker(dataset):
+    global _worker_dataset, _worker_indicators
+    _worker_dataset = dataset
+    # Индикаторы считаются один раз на процесс и переиспользуются во всех его заданиях
+    _worker_indicators = IndicatorStore()
+
+
+def _worker_render(spec, job, output):
+    return render_job(_worker_dataset, spec, job, output, _worker_indicators)
+
+
+def run_report(dataset, spec, output, processes=None):
+    """Выгружает все задания; при processes > 1 графики рисуются пулом процессов с Agg."""
+    jobs = report_jobs(dataset, spec)
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(jobs) <= 1:
+        store = IndicatorStore()
+        results = [render_job(dataset, spec, job, output, store) for job in jobs]
+    else:
+        # Датасет уходит в каждый воркер один раз через initializer, а не с каждым заданием
+        with ProcessPoolExecutor(max_workers=min(processes, len(jobs)), initializer=_init_worker,
+                                 initargs=(dataset,)) as pool:
+            results = list(pool.map(_worker_render, [spec] * len(jobs), jobs, [output] * len(jobs)))
+    return [path for written in results for path in written]
+
+
+def load_dataset(workbook=None, store=None):
+    if workbook:
+        with open(workbook, 'rb') as file:
+            key, df = data_cache.load_workbook(file.read())
+        return FFADataset(df, key=key)
+    archive = ArchiveStore(store)
+    if archive.is_empty:
+        raise SystemExit(f"Архив {store} пуст")
+    return archive.dataset()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная выгрузка графиков и таблиц FFA")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--workbook', help="xlsx-выгрузка BFA")
+    source.add_argument('--store', nargs='?', const=STORE_DIR, help="Каталог локального архива")
+    parser.add_argument('--spec', help="JSON с полями ReportSpec")
+    parser.add_argument('--months', nargs='+', help="Месяцы YYYY-MM (по умолчанию последний)")
+    parser.add_argument('--last-months', type=int, help="Сколько последних месяцев выгрузить")
+    parser.add_argument('--forecast-types', nargs='+')
+    parser.add_argument('--sma', type=int, nargs='+', help="Окна SMA")
+    parser.add_argument('--ewma', type=int, nargs='+', help="Периоды EWMA")
+    parser.add_argument('--std', action='store_true', help="Полосы std вокруг SMA")
+    parser.add_argument('--low', type=float, nargs='+', help="Нижние пороги сигналов")
+    parser.add_argument('--high', type=float, nargs='+', help="Верхние пороги сигналов")
+    parser.add_argument('--formats', nargs='+', choices=FORMATS)
+    parser.add_argument('--output', default='reports', help="Каталог для файлов")
+    parser.add_argument('--processes', type=int, help="Число процессов (по умолчанию по числу ядер)")
+    args = parser.parse_args(argv)
+
+    spec = ReportSpec.from_json(args.spec) if args.spec else ReportSpec()
+    overrides = {
+        'months': args.months, 'last_months': args.last_months, 'forecast_types': args.forecast_types,
+        'sma_windows': args.sma, 'ewma_spans': args.ewma, 'low_thresholds': args.low,
+        'high_thresholds': args.high, 'formats': args.formats,
+    }
+    for name, value in overrides.items():
+        if value is not None:
+            setattr(spec, name, value)
+    if args.std:
+        spec.std_windows = list(spec.sma_windows)
+
+    start = time.perf_counter()
+    dataset = load_dataset(args.workbook, args.store)
+    written = run_report(dataset, spec, args.output, args.processes)
+    print(f"Записано файлов: {len(written)} в {args.output} за {time.perf_counter() - start:.1f} с")
+
+
+if __name__ == '__main__':
+    main()
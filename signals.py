@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+SIGNAL_COLUMNS = ['ArchiveDate', 'Ratio', 'Ratio_prev', 'Type', 'Threshold', 'YearMonth']
+
+
+def compute_ratio(c5tc_data, p5tc_data):
+    """Ряд C5TC / P5TC по общим датам архива, с колонкой Ratio_prev (предыдущее значение)."""
+    merged_data = pd.merge(c5tc_data[['ArchiveDate', 'RouteAverage']],
+                           p5tc_data[['ArchiveDate', 'RouteAverage']], on='ArchiveDate',
+                           suffixes=('_C5TC', '_P5TC'))
+    merged_data['Ratio'] = merged_data['RouteAverage_C5TC'] / merged_data['RouteAverage_P5TC']
+    merged_data['Ratio_prev'] = merged_data['Ratio'].shift(1)
+    return merged_data
+
+
+def crossing_matrix(ratio, ratio_prev, low_thresholds, high_thresholds):
+    """
+    Пробои всех порогов одной broadcast-операцией.
+    Возвращает две булевы матрицы (len(ratio), len(порогов)) для пробоев вниз ('L') и вверх ('S').
+    """
+    ratio = np.asarray(ratio, dtype=float).reshape(-1, 1)
+    ratio_prev = np.asarray(ratio_prev, dtype=float).reshape(-1, 1)
+    low = np.asarray(low_thresholds, dtype=float).reshape(1, -1)
+    high = np.asarray(high_thresholds, dtype=float).reshape(1, -1)
+    # Сравнения с NaN дают False, поэтому первая точка и пропуски сигналов не дают
+    low_hits = (ratio < low) & (ratio_prev >= low)
+    high_hits = (ratio > high) & (ratio_prev <= high)
+    return low_hits, high_hits
+
+
+def detect_signals(dates, ratio, ratio_prev, low_thresholds, high_thresholds):
+    """
+    Сигналы L/S по всем порогам с правилом "только первый сигнал каждого типа в месяце".
+    При нескольких пробоях в один день приоритет у L, затем у порога, указанного раньше.
+    Работает без matplotlib, возвращает DataFrame с колонками SIGNAL_COLUMNS.
+    """
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    ratio = np.asarray(ratio, dtype=float)
+    ratio_prev = np.asarray(ratio_prev, dtype=float)
+    low_thresholds = np.asarray(low_thresholds if low_thresholds is not None else [], dtype=float)
+    high_thresholds = np.asarray(high_thresholds if high_thresholds is not None else [], dtype=float)
+
+    low_hits, high_hits = crossing_matrix(ratio, ratio_prev, low_thresholds, high_thresholds)
+    hits = np.concatenate([low_hits, high_hits], axis=1)
+    thresholds = np.concatenate([low_thresholds, high_thresholds])
+    is_high = np.arange(len(thresholds)) >= len(low_thresholds)
+
+    # np.nonzero идет по строкам (датам), внутри строки - по порогам: сначала L, потом S
+    rows, columns = np.nonzero(hits)
+    months = dates[rows].astype('datetime64[M]').astype(np.int64)
+    group_key = months * 2 + is_high[columns]
+    _, first = np.unique(group_key, return_index=True)
+    first = np.sort(first)
+    rows, columns = rows[first], columns[first]
+
+    signal_dates = pd.DatetimeIndex(dates[rows])
+    return pd.DataFrame({
+        'ArchiveDate': signal_dates,
+        'Ratio': ratio[rows],
+        'Ratio_prev': ratio_prev[rows],
+        'Type': np.where(is_high[columns], 'S', 'L'),
+        'Threshold': thresholds[columns],
+        'YearMonth': signal_dates.to_period('M'),
+    }, columns=SIGNAL_COLUMNS)
+
+
+def ratio_signals(c5tc_data, p5tc_data, low_thresholds, high_thresholds):
+    """(ряд Ratio, сигналы) для исторических данных C5TC и P5TC."""
+    merged_data = compute_ratio(c5tc_data, p5tc_data)
+    signals = detect_signals(merged_data['ArchiveDate'], merged_data['Ratio'], merged_data['Ratio_prev'],
+                             low_thresholds, high_thresholds)
+    return merged_data, signals
+
+
+def extend_ratio_signals(merged_data, signals, c5tc_data, p5tc_data, low_thresholds, high_thresholds):
+    """
+    Продлевает (ряд Ratio, сигналы) на новые даты архива, не пересчитывая историю.
+    Ratio_prev первой новой даты берется из merged_data, а сигналы типа, уже сработавшего
+    в этом месяце, отбрасываются - результат совпадает с ratio_signals по всей истории.
+    """
+    new_data = compute_ratio(c5tc_data, p5tc_data)
+    if len(merged_data) and len(new_data):
+        new_data.loc[0, 'Ratio_prev'] = merged_data['Ratio'].iloc[-1]
+    new_signals = detect_signals(new_data['ArchiveDate'], new_data['Ratio'], new_data['Ratio_prev'],
+                                 low_thresholds, high_thresholds)
+    seen = pd.MultiIndex.from_frame(signals[['YearMonth', 'Type']])
+    new_signals = new_signals[~pd.MultiIndex.from_frame(new_signals[['YearMonth', 'Type']]).isin(seen)]
+    return (pd.concat([merged_data, new_data], ignore_index=True),
+            pd.concat([signals, new_signals], ignore_index=True))
@@ -0,0 +1,167 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from signals import detect_signals
+
+# Псевдокатегория: ближайший месячный контракт (наименьший StartDate) на каждую дату архива
+FRONT_MONTH = 'MON front'
+FRONT_MONTH_SOURCE = 'Monthly Contract (MON)'
+# Короткие имена для ввода спредов в приложении
+ALIASES = {
+    'C5TC': 'C5TC FACT',
+    'P5TC': 'P5TC FACT',
+    'BRENT': 'Brent Oil',
+    'MON1': FRONT_MONTH,
+}
+OPERATIONS = {'/': 'ratio', '-': 'diff'}
+SPREAD_COLUMNS = ['ArchiveDate', 'Left', 'Right', 'Ratio', 'Ratio_prev']
+
+
+@dataclass(frozen=True)
+class SpreadSpec:
+    """Спред двух рядов: отношение ('ratio') или разность ('diff') со своими порогами сигналов."""
+    name: str
+    left: str
+    right: str
+    op: str = 'ratio'
+    low_thresholds: tuple = ()
+    high_thresholds: tuple = ()
+
+    @classmethod
+    def create(cls, left, right, op='ratio', low_thresholds=(), high_thresholds=(), name=None):
+        if op not in OPERATIONS.values():
+            raise ValueError(f"Неизвестная операция спреда: {op}")
+        symbol = '/' if op == 'ratio' else '-'
+        return cls(name=name or f"{left} {symbol} {right}", left=left, right=right, op=op,
+                   low_thresholds=tuple(float(x) for x in low_thresholds),
+                   high_thresholds=tuple(float(x) for x in high_thresholds))
+
+
+def _operand(text):
+    text = text.strip()
+    return ALIASES.get(text.upper(), text)
+
+
+def _numbers(text):
+    return [float(x) for x in text.split(',') if x.strip()]
+
+
+def parse_spreads(text):
+    """
+    Спреды из текста, по одному на строку:
+        C5TC / P5TC; L: 0.75, 0.5; S: 1.75, 2.0
+        C5TC - P5TC; L: -2000; S: 5000
+    Операнды - категории выгрузки или короткие имена из ALIASES, операция отделяется пробелами.
+    ValueError с номером строки, если строка не разбирается.
+    """
+    specs = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        expression, *options = line.split(';')
+        try:
+            symbol = next(symbol for symbol in OPERATIONS if f' {symbol} ' in expression)
+            left, right = expression.split(f' {symbol} ', 1)
+            thresholds = {'L': (), 'S': ()}
+            for option in options:
+                kind, values = option.split(':', 1)
+                kind = kind.strip().upper()
+                if kind not in thresholds:
+                    raise ValueError(kind)
+                thresholds[kind] = _numbers(values)
+        except (StopIteration, ValueError):
+            raise ValueError(f"Строка {number}: '{line.strip()}' - ожидается 'A / B; L: ...; S: ...'") from None
+        specs.append(SpreadSpec.create(_operand(left), _operand(right), OPERATIONS[symbol],
+                                       thresholds['L'], thresholds['S']))
+    return specs
+
+
+@dataclass
+class PriceMatrix:
+    """
+    Цены категорий, выровненные по объединению дат архива: values[i, j] - цена columns[j] на dates[i].
+    present отличает дату без строки в выгрузке от строки с пустой ценой (как inner merge по дате).
+    """
+    dates: np.ndarray
+    columns: list
+    values: np.ndarray
+    present: np.ndarray
+
+    def column(self, category):
+        return self.columns.index(category)
+
+
+def _front_month(dataset, start_date, end_date):
+    data = dataset.category_range(FRONT_MONTH_SOURCE, start_date, end_date)
+    data = data[data['StartDate'].notna()]
+    archive_dates = data['ArchiveDate'].to_numpy(dtype='datetime64[ns]')
+    start_dates = data['StartDate'].to_numpy(dtype='datetime64[ns]')
+    # Сортировка по (дата архива, StartDate): первая строка каждой даты - ближайший контракт
+    order = np.lexsort((start_dates, archive_dates))
+    _, first = np.unique(archive_dates[order], return_index=True)
+    rows = order[first]
+    return archive_dates[rows], data['RouteAverage'].to_numpy(dtype=float)[rows]
+
+
+def _category_series(dataset, category, start_date, end_date):
+    if category == FRONT_MONTH:
+        return _front_month(dataset, start_date, end_date)
+    data = dataset.category_range(category, start_date, end_date)
+    return data['ArchiveDate'].to_numpy(dtype='datetime64[ns]'), data['RouteAverage'].to_numpy(dtype=float)
+
+
+def price_matrix(dataset, categories, start_date=None, end_date=None):
+    """
+    Один проход по истории: каждая категория берется срезом один раз и раскладывается
+    в свою колонку по позиции даты (searchsorted), без попарных merge.
+    """
+    categories = list(dict.fromkeys(categories))
+    series = [_category_series(dataset, category, start_date, end_date) for category in categories]
+    dates = np.unique(np.concatenate([dates for dates, _ in series])) if series else \
+        np.array([], dtype='datetime64[ns]')
+    values = np.full((len(dates), len(categories)), np.nan)
+    present = np.zeros((len(dates), len(categories)), dtype=bool)
+    for column, (category_dates, category_values) in enumerate(series):
+        rows = np.searchsorted(dates, category_dates)
+        values[rows, column] = category_values
+        present[rows, column] = True
+    return PriceMatrix(dates, categories, values, present)
+
+
+@dataclass
+class SpreadSeries:
+    spec: SpreadSpec
+    # Колонки SPREAD_COLUMNS: значение спреда в Ratio, как в таблице сигналов
+    frame: pd.DataFrame
+    signals: pd.DataFrame
+
+
+def compute_spread(matrix, spec):
+    """Спред по датам, где есть строки обеих категорий; Ratio_prev - предыдущая такая дата."""
+    left, right = matrix.column(spec.left), matrix.column(spec.right)
+    rows = matrix.present[:, left] & matrix.present[:, right]
+    left_values, right_values = matrix.values[rows, left], matrix.values[rows, right]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = left_values / right_values if spec.op == 'ratio' else left_values - right_values
+    value_prev = np.concatenate([[np.nan], value[:-1]]) if len(value) else value
+    frame = pd.DataFrame({
+        'ArchiveDate': pd.DatetimeIndex(matrix.dates[rows]),
+        'Left': left_values,
+        'Right': right_values,
+        'Ratio': value,
+        'Ratio_prev': value_prev,
+    }, columns=SPREAD_COLUMNS)
+    signals = detect_signals(frame['ArchiveDate'], value, value_prev, spec.low_thresholds, spec.high_thresholds)
+    return SpreadSeries(spec, frame, signals)
+
+
+def spread_categories(specs):
+    return list(dict.fromkeys(category for spec in specs for category in (spec.left, spec.right)))
+
+
+def compute_spreads(dataset, specs, start_date=None, end_date=None):
+    """Все спреды по одной матрице цен: добавление спреда - две колонки и одна векторная операция."""
+    matrix = price_matrix(dataset, spread_categories(specs), start_date, end_date)
+    return [compute_spread(matrix, spec) for spec in specs]
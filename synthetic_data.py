@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+# Исторические ряды: Category -> (GroupDesc, стартовый уровень, дневная волатильность)
+HISTORY_SERIES = {
+    'C5TC FACT': ('Baltic Cape', 20000.0, 0.035),
+    'P5TC FACT': ('Baltic Panamax', 14000.0, 0.025),
+    'Brent Oil': ('Brent', 80.0, 0.015),
+}
+
+# Кривые FFA: Category -> (частота периода, число контрактов вперед)
+FORECAST_CURVES = {
+    'Monthly Contract (MON)': ('M', 6),
+    'Quarterly Contract (Q)': ('Q', 4),
+    'Calendar Year Contract (CAL)': ('Y', 2),
+}
+
+
+def _contract_labels(periods, freq):
+    years = periods.strftime('%y')
+    if freq == 'Q':
+        return 'CAPE_Q' + periods.quarter.astype(str) + years
+    if freq == 'Y':
+        return 'CAPE_Cal' + years
+    return 'CAPE_' + periods.strftime('%b%y')
+
+
+def _mean_reverting_walk(rng, n, volatility, reversion=0.01):
+    # Лог-отклонение от среднего уровня, чтобы за 20 лет ряд не уходил в бесконечность
+    shocks = rng.normal(0.0, volatility, n)
+    walk = np.empty(n)
+    level = 0.0
+    for i in range(n):
+        level += shocks[i] - reversion * level
+        walk[i] = level
+    return walk
+
+
+def make_frame(years=1, end_date='2025-06-30', seed=0, curves=FORECAST_CURVES):
+    """
+    Синтетическая таблица в схеме выгрузки BFA: Category, GroupDesc, ArchiveDate, StartDate,
+    Index_Label, RouteAverage. years лет рабочих дней архива, на каждую дату - кривые MON/Q/CAL.
+    """
+    rng = np.random.default_rng(seed)
+    archive_dates = pd.bdate_range(end=end_date, periods=int(round(261 * years)))
+    n = len(archive_dates)
+
+    frames = []
+    levels = {}
+    for category, (group, start_level, volatility) in HISTORY_SERIES.items():
+        values = start_level * np.exp(_mean_reverting_walk(rng, n, volatility))
+        levels[category] = values
+        frames.append(pd.DataFrame({
+            'Category': category,
+            'GroupDesc': group,
+            'ArchiveDate': archive_dates,
+            'StartDate': archive_dates,
+            'Index_Label': category,
+            'RouteAverage': values.round(2),
+        }))
+
+    spot = levels['C5TC FACT']
+    for category, (freq, horizon) in curves.items():
+        periods = archive_dates.to_period(freq)
+        # Контракты 1..horizon периодов вперед от периода даты архива
+        offsets = np.arange(1, horizon + 1)
+        contracts = [periods + int(offset) for offset in offsets]
+        contract_periods = np.stack([p.to_timestamp().to_numpy() for p in contracts], axis=1)
+        labels = np.stack([np.asarray(_contract_labels(p, freq)) for p in contracts], axis=1)
+        noise = rng.normal(0.0, 0.05, (n, horizon)) * np.sqrt(offsets)
+        frames.append(pd.DataFrame({
+            'Category': category,
+            'GroupDesc': 'BFA Cape',
+            'ArchiveDate': np.repeat(archive_dates.to_numpy(), horizon),
+            'StartDate': contract_periods.ravel(),
+            'Index_Label': labels.ravel(),
+            'RouteAverage': (spot.reshape(-1, 1) * (1.0 + noise)).ravel().round(2),
+        }))
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def write_workbook(df, path):
+    """Сохраняет таблицу в xlsx так же, как ее выгружают для загрузки в приложение."""
+    df.to_excel(path, index=False)
+    return path
@@ -0,0 +1,35 @@
+import json
+import os
+
+import streamlit as st
+from streamlit.runtime.uploaded_file_manager import UploadedFile, UploadedFileRec
+from streamlit.testing.v1 import AppTest
+
+import data_cache
+import profiling
+from synthetic_data import make_frame, write_workbook
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+COMPUTE_STAGES = ['history_signals', 'forecasts_averaging', 'indicators', 'pivot']
+
+
+def test_compute_stages_reported_once(tmp_path, monkeypatch):
+    path = write_workbook(make_frame(years=1, seed=7), str(tmp_path / 'book.xlsx'))
+    with open(path, 'rb') as file:
+        uploaded = UploadedFile(UploadedFileRec('book', 'book.xlsx', 'application/octet-stream', file.read()), None)
+    monkeypatch.setattr(st, 'file_uploader', lambda *args, **kwargs: uploaded)
+    monkeypatch.setattr(data_cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    metrics_log = tmp_path / 'metrics.jsonl'
+    monkeypatch.setattr(profiling, 'METRICS_LOG', str(metrics_log))
+
+    at = AppTest.from_file(APP, default_timeout=120)
+    for _ in range(3):
+        at.run()
+        assert not at.exception
+
+    with open(metrics_log, encoding='utf-8') as file:
+        runs = [[span['stage'] for span in json.loads(line)['stages']] for line in file]
+    # Расчет выполнен в первом прогоне, повторные с теми же параметрами берут результат из кэша пула
+    assert len(runs) == 3
+    for stage in COMPUTE_STAGES:
+        assert [run.count(stage) for run in runs] == [1, 0, 0], stage
@@ -0,0 +1,31 @@
+from ffa_analytics import RATIO_TYPE, ForecastParams, compute_forecast
+from ffa_dataset import FFADataset
+from plotly_renderer import render_plotly
+from spreads import parse_spreads
+from synthetic_data import make_frame
+
+
+def _render(historical_data_types, spreads):
+    dataset = FFADataset(make_frame(years=1), key='test')
+    dates = dataset.group_dates('BFA Cape')[-3:]
+    params = ForecastParams.create(historical_data_types, ['Monthly Contract (MON)'], dates,
+                                   '2025-01-01', '2025-06-30', low_thresholds=[0.9], high_thresholds=[1.5],
+                                   spreads=parse_spreads(spreads))
+    return render_plotly(compute_forecast(dataset, params))
+
+
+def test_panel_titles_with_spreads():
+    fig = _render(['C5TC FACT', 'P5TC FACT'], "C5TC - P5TC; L: -2000\nBRENT / C5TC")
+    # yaxis2 - вторая ось главной панели, панели спредов начинаются с yaxis3
+    assert fig.layout.yaxis.title.text == 'Route Average'
+    assert fig.layout.yaxis3.title.text == 'C5TC FACT - P5TC FACT'
+    assert fig.layout.yaxis4.title.text == 'Brent Oil / C5TC FACT'
+
+
+def test_panel_titles_with_brent_and_ratio():
+    fig = _render(['C5TC FACT', 'P5TC FACT', 'Brent Oil', RATIO_TYPE], "C5TC - P5TC\nMON1 / C5TC")
+    assert fig.layout.yaxis.title.text == 'Route Average'
+    assert fig.layout.yaxis2.title.text == 'Brent Oil Price'
+    assert fig.layout.yaxis3.title.text == 'C5TC / P5TC Ratio'
+    assert fig.layout.yaxis4.title.text == 'C5TC FACT - P5TC FACT'
+    assert fig.layout.yaxis5.title.text == 'MON front / C5TC FACT'
@@ -0,0 +1,36 @@
+import numpy as np
+
+from sql_store import SQLDataset, SQLiteBackend
+from synthetic_data import make_frame
+
+
+def test_reappend_replaces_rows_without_index_label(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'archive.sqlite'))
+    df = make_frame(years=0.1)
+    df['Index_Label'] = df['Index_Label'].mask(df['Category'].str.contains('FACT|Oil'), None)
+
+    backend.append(df)
+    first = backend.query()
+    backend.append(df)
+    second = backend.query()
+
+    assert len(first) == len(df)
+    assert len(second) == len(df)
+    assert first['Index_Label'].isna().sum() == df['Index_Label'].isna().sum() > 0
+
+
+def test_categories_on_matches_per_date_queries(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'archive.sqlite'))
+    backend.append(make_frame(years=0.2))
+    dataset = SQLDataset(backend)
+    dates = dataset.group_dates('BFA Cape')[-5:]
+    categories = ['Monthly Contract (MON)', 'Quarterly Contract (Q)']
+
+    batched = dataset.categories_on(categories, dates)
+
+    for date in dates:
+        for category in categories:
+            expected = dataset.category_on(category, date)
+            assert len(expected)
+            np.testing.assert_array_equal(batched[category, date]['RouteAverage'].to_numpy(),
+                                          expected['RouteAverage'].to_numpy())
@@ -0,0 +1,134 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from signals import crossing_matrix
+
+# Сколько порогов одного типа отдается одному процессу за раз
+SWEEP_CHUNK = 64
+
+# Выровненный ряд Ratio в процессе-воркере: передается один раз через initializer
+_worker_series = None
+
+
+def forward_returns(ratio, horizon):
+    """Доходность ряда через horizon точек вперед: ratio[t + horizon] / ratio[t] - 1."""
+    ratio = np.asarray(ratio, dtype=float)
+    result = np.full(len(ratio), np.nan)
+    if 0 < horizon < len(ratio):
+        result[:-horizon] = ratio[horizon:] / ratio[:-horizon] - 1.0
+    return result
+
+
+def _prepare_series(dates, ratio, horizon):
+    ratio = np.asarray(ratio, dtype=float)
+    ratio_prev = np.concatenate(([np.nan], ratio[:-1]))
+    months = np.asarray(dates, dtype='datetime64[ns]').astype('datetime64[M]').astype(np.int64)
+    if len(months):
+        months = months - months.min()
+    return ratio, ratio_prev, months, forward_returns(ratio, horizon)
+
+
+def _init_worker(series):
+    global _worker_series
+    _worker_series = series
+
+
+def _threshold_stats(series, kind, thresholds):
+    """
+    Статистика по каждому порогу одного типа ('L' или 'S'):
+    число сигналов (первый в месяце), число сигналов с известной доходностью,
+    сумма и сумма квадратов доходности позиции, число прибыльных сигналов.
+    """
+    ratio, ratio_prev, months, forward = series
+    thresholds = np.asarray(thresholds, dtype=float)
+    if kind == 'L':
+        hits, _ = crossing_matrix(ratio, ratio_prev, thresholds, [])
+    else:
+        _, hits = crossing_matrix(ratio, ratio_prev, [], thresholds)
+
+    # Порядок nonzero по транспонированной матрице: порог, затем дата
+    columns, rows = np.nonzero(hits.T)
+    month_count = int(months.max()) + 1 if len(months) else 1
+    _, first = np.unique(columns * month_count + months[rows], return_index=True)
+    columns, rows = columns[first], rows[first]
+
+    # L - ставка на рост ratio, S - на падение
+    returns = forward[rows] if kind == 'L' else -forward[rows]
+    known = ~np.isnan(returns)
+    returns = np.where(known, returns, 0.0)
+    size = len(thresholds)
+    return {
+        'signals': np.bincount(columns, minlength=size),
+        'known': np.bincount(columns, weights=known, minlength=size),
+        'sum': np.bincount(columns, weights=returns, minlength=size),
+        'sum_sq': np.bincount(columns, weights=returns * returns, minlength=size),
+        'wins': np.bincount(columns, weights=known & (returns > 0), minlength=size),
+    }
+
+
+def _worker_stats(kind, thresholds):
+    return _threshold_stats(_worker_series, kind, thresholds)
+
+
+def _collect(parts):
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def _all_stats(series, low_grid, high_grid, processes):
+    tasks = [('L', low_grid[i:i + SWEEP_CHUNK]) for i in range(0, len(low_grid), SWEEP_CHUNK)]
+    tasks += [('S', high_grid[i:i + SWEEP_CHUNK]) for i in range(0, len(high_grid), SWEEP_CHUNK)]
+
+    if processes == 1 or len(tasks) <= 2:
+        # Маленькая сетка считается быстрее, чем стартует пул процессов
+        results = [_threshold_stats(series, kind, thresholds) for kind, thresholds in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(series,)) as pool:
+            results = list(pool.map(_worker_stats, *zip(*tasks)))
+
+    low_parts = [result for (kind, _), result in zip(tasks, results) if kind == 'L']
+    high_parts = [result for (kind, _), result in zip(tasks, results) if kind == 'S']
+    return _collect(low_parts), _collect(high_parts)
+
+
+def sweep_thresholds(dates, ratio, low_grid, high_grid, horizon=20, processes=None):
+    """
+    Перебор всех пар (нижний порог, верхний порог) для сигналов L/S по ряду Ratio.
+    Для каждой пары: число сигналов и доходность ratio через horizon точек после сигнала
+    (для S со знаком минус). Возвращает таблицу, отсортированную по средней доходности.
+    """
+    low_grid = np.asarray(sorted(set(low_grid)), dtype=float)
+    high_grid = np.asarray(sorted(set(high_grid)), dtype=float)
+    if not len(low_grid) or not len(high_grid) or not len(ratio):
+        return pd.DataFrame()
+
+    series = _prepare_series(dates, ratio, horizon)
+    low, high = _all_stats(series, low_grid, high_grid, processes or os.cpu_count())
+
+    # Сигналы L и S независимы, поэтому пара - это просто сумма статистик двух порогов
+    def combine(name):
+        return (low[name].reshape(-1, 1) + high[name].reshape(1, -1)).ravel()
+
+    known = combine('known')
+    total = combine('sum')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / known
+        std = np.sqrt(np.maximum(combine('sum_sq') / known - mean * mean, 0.0))
+        hit_rate = combine('wins') / known
+
+    result = pd.DataFrame({
+        'Low': np.repeat(low_grid, len(high_grid)),
+        'High': np.tile(high_grid, len(low_grid)),
+        'Signals': combine('signals').astype(int),
+        'L_Signals': np.repeat(low['signals'], len(high_grid)).astype(int),
+        'S_Signals': np.tile(high['signals'], len(low_grid)).astype(int),
+        'MeanReturn': mean,
+        'StdReturn': std,
+        'HitRate': hit_rate,
+        'TotalReturn': total,
+    })
+    result = result[result['Low'] < result['High']]
+    return result.sort_values(['MeanReturn', 'Signals'], ascending=False, na_position='last',
+                              kind='stable').reset_index(drop=True)